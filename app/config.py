@@ -4,6 +4,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 VIZARD_API_KEY = os.getenv("VIZARD_API_KEY")
+VIZARD_BASE_URL = os.getenv("VIZARD_BASE_URL", "https://elb-api.vizard.ai/hvizard-server-front/open-api/v1")
+VIZARD_TIMEOUT = float(os.getenv("VIZARD_TIMEOUT", "30"))
+VIZARD_RETRIES = int(os.getenv("VIZARD_RETRIES", "3"))
+# HTTP/2 to Vizard when the optional h2 package is installed
+VIZARD_HTTP2 = os.getenv("VIZARD_HTTP2", "true").lower() == "true"
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
@@ -11,10 +16,114 @@ INTRO_DIR = os.path.join(DATA_DIR, 'intro')
 OUTRO_DIR = os.path.join(DATA_DIR, 'outro') 
 MERGE_DIR = os.path.join(DATA_DIR, 'merge') 
 
+# Template render mode: "multi_step" (convert -> concat -> logo, three encodes)
+# or "single_pass" (one filtergraph, one encode per clip)
+RENDER_MODE = os.getenv("RENDER_MODE", "multi_step")
+# Per-clip execution: "sequential", "parallel" (bounded worker pool) or
+# "pipelined" (download / render / upload stages overlap across clips)
+RENDER_EXECUTION = os.getenv("RENDER_EXECUTION", "sequential")
+# Parallel render workers per job (0 = size to the job's share of the machine)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+# "pipelined" stage concurrency; queue size is how many clips a stage may run ahead
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "2"))
+PIPELINE_UPLOAD_WORKERS = int(os.getenv("PIPELINE_UPLOAD_WORKERS", "2"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+# Intro/main/outro merge: "auto" (stream copy when segments match) or "reencode"
+CONCAT_MODE = os.getenv("CONCAT_MODE", "auto")
+
+# Background render queue: webhook jobs drained by this many workers
+RENDER_QUEUE_WORKERS = int(os.getenv("RENDER_QUEUE_WORKERS", "2"))
+
+# Backend /templates/{id} responses are reused this long, then revalidated with ETag / Last-Modified
+TEMPLATE_CACHE_TTL = float(os.getenv("TEMPLATE_CACHE_TTL", "300"))
+TEMPLATE_FETCH_TIMEOUT = float(os.getenv("TEMPLATE_FETCH_TIMEOUT", "30"))
+
+# Duplicate /generate submissions (same fields + user) within this window share one project
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "600"))
+
+# Polling fallback for projects whose Vizard webhook never arrives
+RECONCILE_ENABLED = os.getenv("RECONCILE_ENABLED", "true").lower() == "true"
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "15"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
+RECONCILE_MIN_POLL_SECONDS = float(os.getenv("RECONCILE_MIN_POLL_SECONDS", "20"))
+RECONCILE_MAX_POLL_SECONDS = float(os.getenv("RECONCILE_MAX_POLL_SECONDS", "300"))
+# Fail a project once it is this many times past its expected processing time
+RECONCILE_MAX_WAIT_FACTOR = float(os.getenv("RECONCILE_MAX_WAIT_FACTOR", "6"))
+# Assumed source length when it is unknown
+RECONCILE_DEFAULT_VIDEO_SECONDS = float(os.getenv("RECONCILE_DEFAULT_VIDEO_SECONDS", "900"))
+
+# Prompt filter: transcripts encoded per model batch
+FILTER_BATCH_SIZE = int(os.getenv("FILTER_BATCH_SIZE", "32"))
+# Load the embedding model in the background at startup (otherwise on first use)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+# Embedding backend: "torch" (default), "torch-int8", "onnx" or "onnx-int8"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(DATA_DIR, 'onnx'))
+# safetensors cache for the "torch-mmap" backend (weights shared between worker processes)
+EMBEDDING_WEIGHTS_DIR = os.getenv("EMBEDDING_WEIGHTS_DIR", os.path.join(DATA_DIR, 'model_weights'))
+
+# Persistent transcript/prompt embedding cache (SQLite index + memory-mapped float32 matrix)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(DATA_DIR, 'embedding_cache'))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "2048"))
+
+# Shared per-host embedding server (python -m app.services.embedding_server)
+EMBEDDING_SERVER_ENABLED = os.getenv("EMBEDDING_SERVER_ENABLED", "false").lower() == "true"
+EMBEDDING_SERVER_HOST = os.getenv("EMBEDDING_SERVER_HOST", "127.0.0.1")
+EMBEDDING_SERVER_PORT = int(os.getenv("EMBEDDING_SERVER_PORT", "6100"))
+# Requests arriving within this window are encoded as one micro-batch
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "10"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "256"))
+
+# Persistent cache of normalized intro/outro assets
+ASSET_CACHE_ENABLED = os.getenv("ASSET_CACHE_ENABLED", "true").lower() == "true"
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(DATA_DIR, 'asset_cache'))
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Entries used more recently than this are never evicted (may be in use by another process)
+ASSET_CACHE_GRACE_SECONDS = int(os.getenv("ASSET_CACHE_GRACE_SECONDS", "900"))
+
+# Finished renders (videoId + template) -> uploaded URL, so re-rendering a clip is skipped
+RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "true").lower() == "true"
+RENDER_CACHE_PATH = os.getenv("RENDER_CACHE_PATH", os.path.join(DATA_DIR, 'render_cache.sqlite3'))
+# Cached renders older than this are rendered again (the uploaded file may have been removed)
+RENDER_CACHE_TTL = float(os.getenv("RENDER_CACHE_TTL_DAYS", "7")) * 86400
+
+# Shared HTTP downloader (keep-alive pool, retries, streamed to disk)
+DOWNLOAD_POOL_SIZE = int(os.getenv("DOWNLOAD_POOL_SIZE", "16"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "10"))
+# Max seconds without receiving any bytes, not a cap on the whole download
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "60"))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_KB", "1024")) * 1024
+# "auto": parallel byte ranges for large files on servers with Accept-Ranges; "stream": always one stream
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "auto")
+DOWNLOAD_RANGE_PARTS = int(os.getenv("DOWNLOAD_RANGE_PARTS", "4"))
+DOWNLOAD_RANGE_MIN_BYTES = int(os.getenv("DOWNLOAD_RANGE_MIN_MB", "8")) * 1024 * 1024
+# Partial ranged downloads kept here so a retry (or a later job) resumes them
+DOWNLOAD_PARTIAL_DIR = os.getenv("DOWNLOAD_PARTIAL_DIR", os.path.join(DATA_DIR, 'partial_downloads'))
+
+# Remote source probing before /generate: only the container header is fetched with byte ranges
+MAX_VIDEO_DURATION = float(os.getenv("MAX_VIDEO_DURATION", "3600"))
+REMOTE_PROBE_HEAD_BYTES = int(os.getenv("REMOTE_PROBE_HEAD_KB", "256")) * 1024
+# Largest moov box fetched; bigger headers go to ffprobe
+REMOTE_PROBE_MAX_HEADER_BYTES = int(os.getenv("REMOTE_PROBE_MAX_HEADER_MB", "16")) * 1024 * 1024
+REMOTE_PROBE_CACHE_TTL = float(os.getenv("REMOTE_PROBE_CACHE_TTL", "3600"))
+REMOTE_PROBE_TIMEOUT = float(os.getenv("REMOTE_PROBE_TIMEOUT", "20"))
+
 cloud_name = os.getenv("CLOUD_NAME")
 api_key = os.getenv("API_KEY")
 api_secret = os.getenv("API_SECRET")
 
+# Chunked Cloudinary uploads (the URL can point at a local stand-in, see cloud_upload.py)
+CLOUDINARY_UPLOAD_URL = os.getenv(
+    "CLOUDINARY_UPLOAD_URL", f"https://api.cloudinary.com/v1_1/{cloud_name}/video/upload"
+)
+# Cloudinary requires chunks of at least 5 MB (except the last)
+UPLOAD_CHUNK_SIZE = max(5, int(os.getenv("UPLOAD_CHUNK_MB", "20"))) * 1024 * 1024
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_CHUNK_RETRIES = int(os.getenv("UPLOAD_CHUNK_RETRIES", "3"))
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "120"))
+
 # BACKEND_URL = "http://65.49.81.27:5000/api/v1"
 # BACKEND_URL='https://reelty.com.au/api/v1'
 BACKEND_URL='https://reelty-be-0ee7.onrender.com/api/v1'
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from typing import Dict, Optional
+from app.config import IDEMPOTENCY_WINDOW_SECONDS
+
+# paramRequest fields that define "the same" /generate submission
+REQUEST_KEY_FIELDS = ("url", "videoType", "langCode", "clipLength", "maxClipNumber", "templateId", "prompt")
+
+
+def get_user_identity(auth_token: str) -> str:
+    """
+    User id from the JWT payload (sub / id / userId / _id / email), falling back to
+    a hash of the whole token. The signature is not checked here: the backend
+    verifies the token on every call made with it.
+    """
+    try:
+        payload = auth_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        for claim in ("sub", "id", "userId", "_id", "email"):
+            if claims.get(claim):
+                return f"{claim}:{claims[claim]}"
+    except (IndexError, ValueError, AttributeError):
+        pass
+    return "token:" + hashlib.sha256((auth_token or "").encode("utf-8")).hexdigest()
+
+
+def make_request_key(request) -> str:
+    """Hash of the request fields plus the user, so only a user's own duplicates coalesce"""
+    parts = {name: getattr(request, name, None) for name in REQUEST_KEY_FIELDS}
+    parts["url"] = (parts["url"] or "").strip()
+    parts["prompt"] = (parts["prompt"] or "").strip()
+    parts["user"] = get_user_identity(request.auth_token)
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Recent /generate submissions by request key, for IDEMPOTENCY_WINDOW_SECONDS.
+
+    An entry is "reserved" while the first request is still creating the Vizard
+    project (duplicates wait on its future), "processing" once the project
+    exists (duplicates attach to it) and "done" with the stored result.
+    Failed or cancelled projects are released so a retry starts fresh.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.entries: Dict[str, dict] = {}
+        self.stats = {"created": 0, "attached": 0, "replayed": 0}
+
+    def _prune(self):
+        now = time.time()
+        for key, entry in list(self.entries.items()):
+            # Only finished entries expire; in-flight ones live until released
+            if entry["state"] == "done" and now - entry["finished_at"] > self.window_seconds:
+                del self.entries[key]
+
+    def lookup(self, key: str) -> Optional[dict]:
+        self._prune()
+        entry = self.entries.get(key)
+        if entry and entry["state"] != "done" and time.time() - entry["created_at"] > self.window_seconds:
+            # A duplicate after the window starts its own project
+            return None
+        return entry
+
+    def reserve(self, key: str) -> dict:
+        """Claim key for a request about to create its project"""
+        entry = {
+            "state": "reserved",
+            "project_id": None,
+            "result": None,
+            "created_at": time.time(),
+            "finished_at": None,
+            "ready": asyncio.get_running_loop().create_future()
+        }
+        self.entries[key] = entry
+        self.stats["created"] += 1
+        return entry
+
+    def attach_project(self, entry: dict, project_id):
+        """The reserving request created its project; wake duplicates waiting on it"""
+        entry["state"] = "processing"
+        entry["project_id"] = project_id
+        if not entry["ready"].done():
+            entry["ready"].set_result(project_id)
+
+    def complete(self, key: Optional[str], project_id, result: dict):
+        entry = self.entries.get(key) if key else None
+        if entry is None or str(entry["project_id"]) != str(project_id):
+            return
+        entry["state"] = "done"
+        entry["result"] = result
+        entry["finished_at"] = time.time()
+
+    def release(self, key: Optional[str], project_id=None, entry: Optional[dict] = None):
+        """
+        Forget a failed submission; waiting duplicates create their own project.
+        project_id / entry guard against releasing a newer submission under the same key.
+        """
+        current = self.entries.get(key) if key else None
+        if current is None:
+            return
+        if entry is not None and current is not entry:
+            return
+        if project_id is not None and str(current["project_id"]) != str(project_id):
+            return
+        del self.entries[key]
+        if not current["ready"].done():
+            current["ready"].set_result(None)
+
+    def get_stats(self) -> dict:
+        self._prune()
+        by_state = {}
+        for entry in self.entries.values():
+            by_state[entry["state"]] = by_state.get(entry["state"], 0) + 1
+        return {**self.stats, "window_seconds": self.window_seconds, "entries_by_state": by_state}
+
+
+# Global store used by /generate
+idempotency_store = IdempotencyStore(IDEMPOTENCY_WINDOW_SECONDS)
@@ -0,0 +1,142 @@
+import asyncio
+import time
+import traceback
+from typing import Dict, List, Optional
+from app.config import RENDER_QUEUE_WORKERS
+
+
+class JobQueue:
+    """
+    In-process render job queue drained by a fixed pool of asyncio workers.
+
+    Handlers are coroutines; they must push blocking work (ffmpeg, model
+    inference, HTTP) to threads with asyncio.to_thread so the event loop
+    stays free for WebSocket and HTTP traffic.
+    """
+
+    def __init__(self, workers: int, max_history: int = 500):
+        self.worker_count = max(1, workers)
+        self.max_history = max_history
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.jobs: Dict[str, dict] = {}
+
+    def start(self):
+        """Create the queue and worker tasks (idempotent; needs a running loop)"""
+        if self.workers:
+            return
+        self.queue = asyncio.Queue()
+        self.workers = [
+            asyncio.create_task(self._worker(n), name=f"render-worker-{n}")
+            for n in range(self.worker_count)
+        ]
+        print(f"🚀 Job queue started with {self.worker_count} workers")
+
+    async def stop(self):
+        """Cancel the workers (queued jobs are dropped)"""
+        for task in self.workers:
+            task.cancel()
+        for task in self.workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.workers = []
+        print("🛑 Job queue stopped")
+
+    def is_running(self) -> bool:
+        return bool(self.workers) and not all(task.done() for task in self.workers)
+
+    def enqueue(self, job_id, handler, *args) -> dict:
+        """Queue handler(*args) and return the job record immediately"""
+        self.start()
+        job_id = str(job_id)
+        job = {
+            "job_id": job_id,
+            "state": "queued",
+            "progress": 0,
+            "message": "Queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        self.jobs[job_id] = job
+        self.queue.put_nowait((job_id, handler, args))
+        job["position"] = self.queue.qsize()
+        print(f"📥 Job {job_id} queued (depth {self.queue.qsize()})")
+        return job
+
+    def update(self, job_id, **fields):
+        """Record progress or other state for a job"""
+        job = self.jobs.get(str(job_id))
+        if job:
+            job.update(fields)
+
+    def cancel(self, job_id) -> bool:
+        """Mark a queued job cancelled; a worker will skip it"""
+        job = self.jobs.get(str(job_id))
+        if job and job["state"] == "queued":
+            job["state"] = "cancelled"
+            job["finished_at"] = time.time()
+            return True
+        return False
+
+    async def _worker(self, n: int):
+        while True:
+            job_id, handler, args = await self.queue.get()
+            job = self.jobs.get(job_id)
+            try:
+                if job is None or job["state"] == "cancelled":
+                    continue
+                job["state"] = "running"
+                job["started_at"] = time.time()
+                print(f"⚙️ Worker {n} running job {job_id}")
+
+                await handler(*args)
+
+                # Handlers may have set a terminal state themselves (e.g. cancelled)
+                if job["state"] == "running":
+                    job["state"] = "done"
+            except asyncio.CancelledError:
+                if job:
+                    job["state"] = "cancelled"
+                raise
+            except Exception as e:
+                print(f"❌ Job {job_id} failed: {e}")
+                traceback.print_exc()
+                if job:
+                    job["state"] = "failed"
+                    job["error"] = str(e)
+            finally:
+                if job and job["finished_at"] is None and job["state"] != "running":
+                    job["finished_at"] = time.time()
+                self.queue.task_done()
+                self._prune()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_history"""
+        finished = [j for j in self.jobs.values() if j["state"] in ("done", "failed", "cancelled")]
+        excess = len(self.jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job in sorted(finished, key=lambda j: j["created_at"])[:excess]:
+            self.jobs.pop(job["job_id"], None)
+
+    def get_job(self, job_id) -> Optional[dict]:
+        return self.jobs.get(str(job_id))
+
+    def get_stats(self) -> dict:
+        states = {}
+        for job in self.jobs.values():
+            states[job["state"]] = states.get(job["state"], 0) + 1
+        return {
+            "running": self.is_running(),
+            "workers": self.worker_count,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "jobs_by_state": states
+        }
+
+
+# Global instance
+job_queue = JobQueue(RENDER_QUEUE_WORKERS)
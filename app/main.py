@@ -1,7 +1,16 @@
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import shutil
 import uvicorn
-from app.routes import router 
+from app.routes import router, pending_clips, accept_vizard_result, fail_pending_project
+from app.reconciler import reconciler
+from app.job_queue import job_queue
+from app.services.vizard_client import vizard_client
+from app.services.template_cache import template_cache
+from app.services.filter_clips import start_model_warmup, get_model_status
+from app.services.embedding_cache import embedding_cache
+from app.config import MODEL_WARMUP, RECONCILE_ENABLED
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(
@@ -28,9 +37,46 @@ app.add_middleware(
 
 app.include_router(router, prefix="/ai")
 
+@app.on_event("startup")
+async def start_background_workers():
+    job_queue.start()
+    if RECONCILE_ENABLED:
+        reconciler.start(pending_clips, accept_vizard_result, fail_pending_project)
+    if MODEL_WARMUP:
+        start_model_warmup()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await reconciler.stop()
+    await job_queue.stop()
+    await vizard_client.aclose()
+    await template_cache.aclose()
+
 @app.get("/")
 def read_root():
     return {"message": "FastAPI is running ✅"}
+
+@app.get("/ready")
+def readiness():
+    """Readiness for load balancers: 200 once model (if warming up), ffmpeg and queue are ready"""
+    model = get_model_status()
+    ffmpeg_ok = shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+    queue = job_queue.get_stats()
+
+    # Without warmup the model loads on first use and doesn't gate traffic
+    model_ok = model["loaded"] or not MODEL_WARMUP
+    ready = model_ok and ffmpeg_ok and queue["running"]
+
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "model": model,
+            "ffmpeg": ffmpeg_ok,
+            "queue": queue,
+            "embedding_cache": embedding_cache.get_stats()
+        }
+    )
         
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import asyncio
+import time
+import traceback
+from typing import Callable, Optional
+from app.config import (
+    RECONCILE_INTERVAL, RECONCILE_CONCURRENCY, RECONCILE_MIN_POLL_SECONDS,
+    RECONCILE_MAX_POLL_SECONDS, RECONCILE_MAX_WAIT_FACTOR, RECONCILE_DEFAULT_VIDEO_SECONDS
+)
+from app.services.vizard_client import VizardError
+from app.services.clipper import run_clip_generation
+
+
+def expected_processing_seconds(task_data: dict) -> float:
+    """
+    Rough Vizard turnaround for a project: a fixed overhead plus time proportional
+    to the source length (when known) and the number of clips requested.
+    """
+    request = task_data['request']
+    video_seconds = task_data.get('video_duration') or RECONCILE_DEFAULT_VIDEO_SECONDS
+    clip_count = getattr(request, 'maxClipNumber', 0) or 10
+    return 60 + 0.3 * video_seconds + 3 * clip_count
+
+
+class VizardReconciler:
+    """
+    Safety net for lost Vizard webhooks.
+
+    Pending projects whose webhook is overdue (older than their expected
+    processing time) are polled through the Vizard query endpoint. The poll
+    interval starts at a fraction of the expected time and doubles per
+    unfinished poll (clamped to [min, max]); at most `concurrency` queries run
+    at once. Finished projects go through on_result, the same path as the
+    webhook. Projects Vizard reports as failed, or overdue by
+    RECONCILE_MAX_WAIT_FACTOR, are failed; transient codes are polled again.
+    """
+
+    def __init__(self, interval=RECONCILE_INTERVAL, concurrency=RECONCILE_CONCURRENCY):
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.task: Optional[asyncio.Task] = None
+        self.pending: Optional[dict] = None
+        self.on_result: Optional[Callable] = None
+        self.on_failure: Optional[Callable] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight = set()
+        # Strong references: the event loop only keeps weak ones to running tasks
+        self._poll_tasks = set()
+        self.stats = {"polls": 0, "recovered": 0, "still_processing": 0, "errors": 0, "timed_out": 0}
+
+    def start(self, pending: dict, on_result: Callable, on_failure: Callable):
+        """
+        pending: project id -> task data (the pending_clips dict)
+        on_result(project_id, data, source): coroutine accepting a finished project
+        on_failure(project_id, actual_key, message, error_code): coroutine failing a project
+        """
+        if self.task and not self.task.done():
+            return
+        self.pending = pending
+        self.on_result = on_result
+        self.on_failure = on_failure
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.task = asyncio.create_task(self._run(), name="vizard-reconciler")
+        print(f"🔁 Vizard reconciler started (every {self.interval}s, {self.concurrency} concurrent polls)")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for poll_task in list(self._poll_tasks):
+            poll_task.cancel()
+        await asyncio.gather(*self._poll_tasks, return_exceptions=True)
+
+    def _next_poll_delay(self, task_data) -> float:
+        expected = expected_processing_seconds(task_data)
+        delay = expected * 0.25 * 2 ** task_data.get('polls', 0)
+        return min(RECONCILE_MAX_POLL_SECONDS, max(RECONCILE_MIN_POLL_SECONDS, delay))
+
+    def _due(self, task_data, now) -> bool:
+        if task_data.get('result_received') or task_data.get('job_id') or task_data['future'].done():
+            return False
+        if 'next_poll_at' not in task_data:
+            # First poll once the webhook is overdue
+            task_data['next_poll_at'] = task_data['created_at'] + expected_processing_seconds(task_data)
+        return now >= task_data['next_poll_at']
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                now = time.time()
+                for key, task_data in list(self.pending.items()):
+                    if key in self._inflight or not self._due(task_data, now):
+                        continue
+                    self._inflight.add(key)
+                    poll_task = asyncio.create_task(self._poll(key, task_data))
+                    self._poll_tasks.add(poll_task)
+                    poll_task.add_done_callback(self._poll_tasks.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Reconciler error: {e}")
+                traceback.print_exc()
+
+    async def _poll(self, key, task_data):
+        try:
+            async with self._semaphore:
+                # The webhook may have arrived while waiting for a slot
+                if not self._due(task_data, time.time()):
+                    return
+                self.stats["polls"] += 1
+                task_data['polls'] = task_data.get('polls', 0) + 1
+                try:
+                    response = await run_clip_generation(key)
+                except VizardError as e:
+                    self.stats["errors"] += 1
+                    print(f"⚠️ Poll for {key} failed: {e}")
+                    response = None
+
+            age = time.time() - task_data['created_at']
+            if response is not None and response.ok:
+                # Finished, possibly with no clips: an empty result, not something to keep polling
+                self.stats["recovered"] += 1
+                print(f"🔁 Recovered project {key} by polling after {age:.0f}s "
+                      f"({len(response.videos)} clips, webhook missing)")
+                await self.on_result(key, {**response.raw, "videos": response.videos}, "poll")
+                return
+
+            if response is not None and response.failed:
+                await self.on_failure(
+                    key, key, f"Vizard processing failed: {response.message or response.code}", "VIZARD_FAILED"
+                )
+                return
+
+            if response is not None and not response.is_processing:
+                # Rate limited, Vizard internal error or an unknown code: try again later,
+                # the max-wait timeout below gives up eventually
+                self.stats["errors"] += 1
+                print(f"⚠️ Poll for {key} returned code {response.code} ({response.message}), retrying later")
+
+            if age > expected_processing_seconds(task_data) * RECONCILE_MAX_WAIT_FACTOR:
+                self.stats["timed_out"] += 1
+                await self.on_failure(
+                    key, key, f"No result from Vizard after {age / 60:.0f} minutes", "VIZARD_TIMEOUT"
+                )
+                return
+
+            self.stats["still_processing"] += 1
+            task_data['next_poll_at'] = time.time() + self._next_poll_delay(task_data)
+        except Exception as e:
+            print(f"❌ Reconcile of {key} failed: {e}")
+            traceback.print_exc()
+        finally:
+            self._inflight.discard(key)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "running": bool(self.task) and not self.task.done(),
+            "inflight": len(self._inflight)
+        }
+
+
+# Global reconciler, started with the app
+reconciler = VizardReconciler()
@@ -5,16 +5,21 @@ from app.services.filter_clips import filter_clips
 from app.services.upload_video import upload_video
 from app.services.clipper import run_clip_generation
 from app.services.get_lang import get_language_code
-from app.services.add_template import Add_Template
+from app.services.add_template import Add_Template, prepare_template_assets
 from app.services.duration_find import get_extension_from_url
+from app.services.remote_probe import probe_remote_media, get_remote_probe_stats
 from app.schema import paramRequest, CancelResponse
 from app.services.store_response import store_in_db
-from app.config import BACKEND_URL
+from app.config import BACKEND_URL, ASSET_CACHE_ENABLED, IDEMPOTENCY_WINDOW_SECONDS, MAX_VIDEO_DURATION
 from app.websocket_manager import manager
+from app.job_queue import job_queue
+from app.reconciler import reconciler
+from app.idempotency import idempotency_store, make_request_key
+from app.services.render_cache import render_cache
+from app.services.template_cache import template_cache
+from typing import Optional
 import asyncio
-import requests
 import json
-import httpx
 import time
 from dotenv import load_dotenv
 load_dotenv(override=True)  # <-- this must come before accessing os.getenv()
@@ -24,6 +29,9 @@ load_dotenv(override=True)  # <-- this must come before accessing os.getenv()
 pending_clips = {}
 cancelled_tasks = set()
 
+# Speculative template preparation at /generate (see start_template_prep)
+template_prep_stats = {"started": 0, "used": 0, "failed": 0, "seconds_saved_total": 0.0}
+
 router = APIRouter()
 
 def find_project_in_pending(project_id):
@@ -55,20 +63,75 @@ def convert_aspect_ratio(aspect_ratio_label: str) -> float:
     return aspect_ratio_map.get(aspect_ratio_label, 1)
 
 
+def get_template_urls(template_info: dict):
+    """(intro, outro, logo) URLs of a template, None where not set"""
+    return tuple(
+        (template_info.get(field) or '').strip() or None
+        for field in ('introVideo', 'outroVideo', 'overlayLogo')
+    )
+
+
+def start_template_prep(template_info: dict):
+    """
+    Normalize the template intro/outro in the background while Vizard works,
+    so the webhook finds them in the asset cache. Returns the task or None.
+    """
+    intro_url, outro_url, _ = get_template_urls(template_info)
+    if not ASSET_CACHE_ENABLED or not (intro_url or outro_url):
+        return None
+    template_prep_stats["started"] += 1
+    task = asyncio.create_task(asyncio.to_thread(
+        prepare_template_assets, template_info['aspectRatio'], intro_url, outro_url
+    ))
+    task.started_at = time.time()
+    task.add_done_callback(log_template_prep_error)
+    return task
+
+
+def log_template_prep_error(task):
+    if not task.cancelled() and task.exception():
+        # Not fatal: the webhook prepares the assets itself
+        print(f"⚠️ Template prep failed: {task.exception()}")
+
+
+def record_template_prep(project_id, prep_task, wait_ended_at=None) -> float:
+    """
+    Seconds of template preparation taken off the webhook-to-result path: the
+    part of the prep that overlapped the wait for Vizard (which ends when the
+    result arrives, wait_ended_at). Prep still running after that is not saved.
+    """
+    if prep_task is None:
+        return 0.0
+    now = time.time()
+    if prep_task.done():
+        if prep_task.cancelled() or prep_task.exception():
+            template_prep_stats["failed"] += 1
+            return 0.0
+        started, finished = prep_task.result()
+    else:
+        # Still running: Add_Template waits on the in-flight build instead of repeating it
+        started, finished = prep_task.started_at, now
+    saved = max(0.0, min(finished, now, wait_ended_at or now) - started)
+    template_prep_stats["used"] += 1
+    template_prep_stats["seconds_saved_total"] += saved
+    job_queue.update(project_id, template_prep_seconds_saved=round(saved, 2))
+    print(f"⚡ Template assets prepared ahead: {saved:.1f}s saved for {project_id}")
+    return saved
+
+
 async def fetch_template_info(template_id: str, auth_token: str) -> dict:
-    """Async function to fetch template information"""
-    headers = {"Authorization": f"Bearer {auth_token}"}
-    
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            response = await client.get(
-                f"{BACKEND_URL}/templates/{template_id}", 
-                headers=headers
-            )
-            response.raise_for_status()
-            return response.json()['data']
-        except httpx.HTTPError as e:
-            raise ValueError(f"Failed to fetch template info: {str(e)}")
+    """Template information from the backend, through the revalidating template cache"""
+    return await template_cache.get(template_id, auth_token)
+
+
+def probe_video_duration(url: str) -> Optional[float]:
+    """Source duration from its container header, or None if it cannot be probed"""
+    try:
+        return probe_remote_media(url).duration
+    except Exception as e:
+        # Vizard does its own checks; a failed probe only skips ours
+        print(f"⚠️ Could not probe video duration: {e}")
+        return None
 
 
 async def get_video_extension(url: str, video_type: int):
@@ -94,12 +157,66 @@ def validate_extension(ext: str) -> bool:
 
 # routes.py - Key Updates
 
+def processing_response(project_id, duplicate=False) -> dict:
+    response = {
+        "status": "processing",
+        "project_id": project_id,
+        "message": "Connect to /ws/{project_id} for real-time progress",
+        "websocket_url": f"/ws/{project_id}"
+    }
+    if duplicate:
+        response["duplicate"] = True
+    return response
+
+
 @router.post("/generate", tags=["Video Processing"])
 async def handle_generate_clip(request: paramRequest):
     """
     Start video processing and return project_id
     Client should connect to /ws/{project_id} for progress updates
+
+    A duplicate submission (same video, options, prompt and user within
+    IDEMPOTENCY_WINDOW_SECONDS) does not create a second Vizard project: while the
+    first is running it gets the same project_id, so both clients follow one
+    progress stream; once finished it gets the stored result.
     """
+    key = make_request_key(request)
+    entry = idempotency_store.lookup(key)
+
+    if entry is not None and entry["state"] == "reserved":
+        # The first request is still uploading to Vizard; wait for its project id
+        try:
+            await asyncio.wait_for(asyncio.shield(entry["ready"]), IDEMPOTENCY_WINDOW_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        entry = idempotency_store.lookup(key)
+
+    if entry is not None and entry["state"] == "done":
+        idempotency_store.stats["replayed"] += 1
+        print(f"♻️ Duplicate /generate, returning stored result of {entry['project_id']}")
+        return {**entry["result"], "duplicate": True}
+
+    if entry is not None and entry["state"] == "processing":
+        idempotency_store.stats["attached"] += 1
+        print(f"🔗 Duplicate /generate attached to project {entry['project_id']}")
+        return processing_response(entry["project_id"], duplicate=True)
+
+    entry = idempotency_store.reserve(key)
+    try:
+        response = await create_generate_project(request, key)
+    except BaseException:
+        idempotency_store.release(key, entry=entry)
+        raise
+    if response.get("status") == "processing":
+        idempotency_store.attach_project(entry, response["project_id"])
+    else:
+        idempotency_store.release(key, entry=entry)
+    return response
+
+
+async def create_generate_project(request: paramRequest, idempotency_key: str) -> dict:
+    """Validate a /generate request, create its Vizard project and register it as pending"""
+    probe_task = None
     try:
         print("📝 Generate request received:", request.prompt)
         
@@ -110,23 +227,21 @@ async def handle_generate_clip(request: paramRequest):
         clip_length_list = [request.clipLength]
         if not (0 <= request.maxClipNumber <= 100):
             return {"error": "clipNumber must be between 0 and 100"}
+
+        # Read the source's container header (a few hundred KB) while the template is fetched
+        if request.videoType == 1:
+            probe_task = asyncio.create_task(asyncio.to_thread(probe_video_duration, request.url))
         
         template_info = None
         aspect_ratio = 1
         
         if request.templateId:
-            headers = {"Authorization": f"Bearer {request.auth_token}"}
             try:
-                template_response = requests.get(
-                    f"{BACKEND_URL}/templates/{request.templateId}", 
-                    headers=headers
-                )
-                template_response.raise_for_status()
-                template_info = template_response.json()['data']
+                template_info = await fetch_template_info(request.templateId, request.auth_token)
                 aspect_ratio = convert_aspect_ratio(template_info['aspectRatio'])
             except Exception as e:
                 return {"error": f"Failed to fetch template info: {str(e)}"}
-        
+
         # Find video duration
         ext = None
         try:
@@ -139,8 +254,9 @@ async def handle_generate_clip(request: paramRequest):
         except Exception as e:
             return {"error": f"Failed to get video extension: {str(e)}"}
 
-        # if round(duration_seconds) > 3600:
-        #     return {"error": "Video duration must be less than 3600 seconds"}
+        video_duration = await probe_task if probe_task is not None else None
+        if video_duration and video_duration > MAX_VIDEO_DURATION:
+            return {"error": f"Video duration must not exceed {MAX_VIDEO_DURATION:.0f} seconds"}
         
         # Validate extension
         supported_exts = ["mp4", "3gp", "avi", "mov"]
@@ -149,7 +265,7 @@ async def handle_generate_clip(request: paramRequest):
 
         # Upload Video to Vizard
         print("📤 Uploading video to Vizard...")
-        response = upload_video(
+        response = await upload_video(
             request.url, 
             video_type=request.videoType, 
             lang=request.langCode, 
@@ -159,10 +275,14 @@ async def handle_generate_clip(request: paramRequest):
             ext=ext
         )
 
-        if response['code'] == 2000:
-            project_id = response['projectId']
+        if response.ok:
+            project_id = response.project_id
             print(f"✅ Project created: {project_id}")
             print("project id type:-----", type(project_id))
+
+            # Vizard takes minutes; use that window to prepare the template assets
+            # (only now, so rejected requests never pay for downloads and encodes)
+            template_prep = start_template_prep(template_info) if template_info else None
             
             # Store task metadata
             loop = asyncio.get_event_loop()
@@ -171,6 +291,9 @@ async def handle_generate_clip(request: paramRequest):
                 'future': future,
                 'request': request,
                 'template_info': template_info,
+                'template_prep': template_prep,
+                'idempotency_key': idempotency_key,
+                'video_duration': video_duration,
                 'created_at': time.time()
             }
             
@@ -182,22 +305,21 @@ async def handle_generate_clip(request: paramRequest):
             )
             
             # Return project_id for client to connect WebSocket
-            return {
-                "status": "processing",
-                "project_id": project_id,
-                "message": "Connect to /ws/{project_id} for real-time progress",
-                "websocket_url": f"/ws/{project_id}"
-            }
+            return processing_response(project_id)
         else:
             return {
                 "status": "failed", 
-                "reason": response.get("message", "Upload failed"), 
-                "details": response
+                "reason": response.message or "Upload failed", 
+                "details": response.raw
             }
             
     except Exception as e:
         print(f"❌ Generate error: {e}")
         return {"error": str(e)}
+    finally:
+        # Rejected before the duration check: nobody will await the probe
+        if probe_task is not None and not probe_task.done():
+            probe_task.cancel()
 
 
 # @router.websocket("/ws/connect/{project_id}")
@@ -338,7 +460,8 @@ async def websocket_endpoint(websocket: WebSocket, project_id: str):
         # Send initial progress if task exists
         actual_key = find_project_in_pending(project_id)
         print("actual key found----------------", actual_key)
-        if actual_key is not None:
+        # Skip it when the project is already further along (reconnect / attached duplicate)
+        if actual_key is not None and (manager.last_progress(project_id) or 0) < 25:
             print(f"⏳ Sending initial progress for {project_id}")
             await manager.send_progress(
                 project_id, 
@@ -436,7 +559,7 @@ async def websocket_endpoint(websocket: WebSocket, project_id: str):
             except asyncio.CancelledError:
                 pass
         
-        manager.disconnect(project_id)
+        manager.disconnect(project_id, websocket)
         print(f"🔌 WebSocket cleanup complete for {project_id}")
 
 # Debugging endpoint - check connection status
@@ -460,200 +583,355 @@ async def check_websocket_status(project_id: str):
     }
 
 
-@router.post("/webhook/vizard", tags=["Webhooks"])
-async def receive_vizard_webhook(request: Request):
+def release_pending(actual_key):
+    """Drop a pending project that did not complete; duplicates of it may start over"""
+    task_data = pending_clips.pop(actual_key, None)
+    if task_data is not None:
+        idempotency_store.release(task_data.get('idempotency_key'), project_id=actual_key)
+    return task_data
+
+
+def consume_cancellation(project_id, actual_key) -> bool:
+    """Return True (clearing the marker and pending entry) if the project was cancelled"""
+    if project_id in cancelled_tasks or actual_key in cancelled_tasks:
+        cancelled_tasks.discard(project_id)
+        if actual_key: cancelled_tasks.discard(actual_key)
+        release_pending(actual_key)
+        return True
+    return False
+
+
+async def report_progress(project_id, progress: int, message: str, **kwargs):
+    """Send progress over WebSocket and record it on the render job"""
+    job_queue.update(project_id, progress=progress, message=message)
+    await manager.send_progress(project_id, progress, message, **kwargs)
+
+
+async def process_vizard_result(project_id, actual_key, data: dict):
     """
-    Receive webhook from Vizard when processing completes
+    Apply template, filter and store the clips of a finished Vizard project.
+    Runs on a job-queue worker; blocking stages run in threads.
     """
+    task_data = pending_clips.get(actual_key)
+    if task_data is None:
+        print(f"⚠️ Project {project_id} no longer pending, skipping")
+        job_queue.update(project_id, state="cancelled")
+        return
+
+    future = task_data['future']
+    req = task_data['request']
+    template_info = task_data['template_info']
+
     try:
-        data = await request.json()
-        print("📩 Vizard webhook received:", data.get("projectId"))
+        print("checking for sending progress 50--------------")
+        # Progress: 50% - Clips generated
+        await report_progress(
+            project_id, 
+            50, 
+            "Video clips generated successfully",
+            clips_count=len(data.get('videos', []))
+        )
+        
+        clip_res = data
+        
+        # Check cancellation
+        if consume_cancellation(project_id, actual_key):
+            await manager.send_cancelled(project_id)
+            job_queue.update(project_id, state="cancelled")
+            return
+        
+        # Stage order: cheap transcript filtering first, so only surviving clips are rendered
+        # Progress: 55% - Filtering clips
+        if (req.prompt and req.prompt.strip() and 
+            req.prompt.lower() != "string"):
+            await report_progress(project_id, 55, "Filtering clips based on your prompt...")
+            videos = clip_res['videos']
+            if videos and len(videos) > 0 and videos[0].get("transcript"):
+                try:
+                    filtered = await asyncio.to_thread(filter_clips, videos, req.prompt)
+                    clip_res['videos'] = filtered
+                    await report_progress(
+                        project_id, 
+                        60, 
+                        f"Filtered to {len(filtered)} of {len(videos)} clips"
+                    )
+                except Exception as e:
+                    print(f"⚠️ Filter error: {e}")
+                    await report_progress(project_id, 60, "Filter skipped")
 
-        project_id = data.get("projectId")
-        code = data.get("code")
+        # Never render more clips than the user asked for
+        if req.maxClipNumber and len(clip_res['videos']) > req.maxClipNumber:
+            print(f"✂️ Truncating {len(clip_res['videos'])} clips to {req.maxClipNumber}")
+            clip_res['videos'] = clip_res['videos'][:req.maxClipNumber]
         
-        if code != 2000 or not project_id:
-            return {"status": "ignored", "reason": "Invalid webhook data"}
+        # Check cancellation again
+        if consume_cancellation(project_id, actual_key):
+            await manager.send_cancelled(project_id)
+            job_queue.update(project_id, state="cancelled")
+            return
         
-        # Find actual key in pending_clips
-        actual_key = find_project_in_pending(project_id)
+        # Progress: 65% - Applying template (to surviving clips only)
+        print("checking for sending progress 65--------------", template_info)
+        if req.templateId and template_info and clip_res['videos']:
+            clip_count = len(clip_res['videos'])
+            await report_progress(
+                project_id, 65,
+                f"Applying custom template to {clip_count} clip{'s' if clip_count != 1 else ''}..."
+            )
+            try:
+                record_template_prep(
+                    project_id, task_data.get('template_prep'), task_data.get('result_received_at')
+                )
+
+                # Check if template URLs are valid
+                intro_url = template_info.get('introVideo', '').strip()
+                outro_url = template_info.get('outroVideo', '').strip()
+                logo_url = template_info.get('overlayLogo', '').strip()
+                
+                print(f"🔍 Template URLs - intro: '{intro_url}', outro: '{outro_url}', logo: '{logo_url}'")
+                
+                # Apply template if at least one component is available
+                if intro_url or outro_url or logo_url:
+                    clips = await asyncio.to_thread(
+                        Add_Template,
+                        clip_res['videos'], 
+                        template_info['aspectRatio'], 
+                        intro_url if intro_url else None,
+                        outro_url if outro_url else None,
+                        logo_url if logo_url else None
+                    )
+                    clip_res['videos'] = clips
+                    components = []
+                    if intro_url: components.append("intro")
+                    if outro_url: components.append("outro")
+                    if logo_url: components.append("logo")
+                    await report_progress(project_id, 85, f"Template applied: {', '.join(components)}")
+                else:
+                    print(f"⚠️ No template components available")
+                    await report_progress(project_id, 85, "Template skipped - no components")
+            except Exception as e:
+                print(f"⚠️ Template error: {e}")
+                await report_progress(project_id, 85, "Template skipped, continuing...")
         
-        # Check if task was cancelled
-        if project_id in cancelled_tasks or actual_key in cancelled_tasks:
-            print(f"⚠️ Webhook for cancelled task: {project_id}")
-            cancelled_tasks.discard(project_id)
-            if actual_key: cancelled_tasks.discard(actual_key)
-            if actual_key and actual_key in pending_clips:
-                del pending_clips[actual_key]
-            return {"status": "task_was_cancelled"}
+        # Final cancellation check
+        if consume_cancellation(project_id, actual_key):
+            await manager.send_cancelled(project_id)
+            job_queue.update(project_id, state="cancelled")
+            return
         
-        # Check if task exists
-        if actual_key is None:
-            print(f"⚠️ Unknown project: {project_id}")
-            return {"status": "project_not_found"}
+        # Progress: 90% - Calculating credits
+        await report_progress(project_id, 90, "Calculating credits and saving...")
         
-        task_data = pending_clips[actual_key]
-        future = task_data['future']
-        req = task_data['request']
-        template_info = task_data['template_info']
+        total_duration = sum(clip.get('videoMsDuration', clip.get('duration', 0)) / 1000 for clip in clip_res['videos'])
+        total_credits = int(total_duration // 60)
         
-        if future.done():
-            return {"status": "already_processed"}
+        # Store in database
+        clips_stored_id = await asyncio.to_thread(
+            store_in_db,
+            req, 
+            clip_res["videos"], 
+            total_credits, 
+            main_video_duration=round(total_duration)
+        )
         
-        try:
-            print("checking for sending progress 50--------------")
-            # Progress: 50% - Clips generated
-            await manager.send_progress(
-                project_id, 
-                50, 
-                "Video clips generated successfully",
-                clips_count=len(data.get('videos', []))
-            )
-            
-            clip_res = data
-            
-            # Check cancellation
-            if project_id in cancelled_tasks or actual_key in cancelled_tasks:
-                cancelled_tasks.discard(project_id)
-                if actual_key: cancelled_tasks.discard(actual_key)
-                del pending_clips[actual_key]
-                await manager.send_cancelled(project_id)
-                return {"status": "cancelled"}
-            
-            # Progress: 60% - Applying template
-            print("checking for sending progress 60--------------", template_info)
-            if req.templateId and template_info:
-                await manager.send_progress(project_id, 60, "Applying custom template...")
-                try:
-                    # Check if template URLs are valid
-                    intro_url = template_info.get('introVideo', '').strip()
-                    outro_url = template_info.get('outroVideo', '').strip()
-                    logo_url = template_info.get('overlayLogo', '').strip()
-                    
-                    print(f"🔍 Template URLs - intro: '{intro_url}', outro: '{outro_url}', logo: '{logo_url}'")
-                    
-                    # Apply template if at least one component is available
-                    if intro_url or outro_url or logo_url:
-                        clips = Add_Template(
-                            clip_res['videos'], 
-                            template_info['aspectRatio'], 
-                            intro_url if intro_url else None,
-                            outro_url if outro_url else None,
-                            logo_url if logo_url else None
-                        )
-                        clip_res['videos'] = clips
-                        components = []
-                        if intro_url: components.append("intro")
-                        if outro_url: components.append("outro")
-                        if logo_url: components.append("logo")
-                        await manager.send_progress(project_id, 70, f"Template applied: {', '.join(components)}")
-                    else:
-                        print(f"⚠️ No template components available")
-                        await manager.send_progress(project_id, 70, "Template skipped - no components")
-                except Exception as e:
-                    print(f"⚠️ Template error: {e}")
-                    await manager.send_progress(project_id, 70, "Template skipped, continuing...")
-            
-            # Check cancellation again
-            if project_id in cancelled_tasks or actual_key in cancelled_tasks:
-                cancelled_tasks.discard(project_id)
-                if actual_key: cancelled_tasks.discard(actual_key)
-                del pending_clips[actual_key]
-                await manager.send_cancelled(project_id)
-                return {"status": "cancelled"}
-            
-            # Progress: 75% - Filtering clips
-            if (req.prompt and req.prompt.strip() and 
-                req.prompt.lower() != "string"):
-                await manager.send_progress(project_id, 75, "Filtering clips based on your prompt...")
-                videos = clip_res['videos']
-                if videos and len(videos) > 0 and videos[0].get("transcript"):
-                    try:
-                        filtered = filter_clips(videos, req.prompt)
-                        clip_res['videos'] = filtered
-                        await manager.send_progress(
-                            project_id, 
-                            85, 
-                            f"Filtered to {len(filtered)} relevant clips"
-                        )
-                    except Exception as e:
-                        print(f"⚠️ Filter error: {e}")
-                        await manager.send_progress(project_id, 85, "Filter skipped")
-            
-            # Final cancellation check
-            if project_id in cancelled_tasks or actual_key in cancelled_tasks:
-                cancelled_tasks.discard(project_id)
-                if actual_key: cancelled_tasks.discard(actual_key)
-                del pending_clips[actual_key]
-                await manager.send_cancelled(project_id)
-                return {"status": "cancelled"}
-            
-            # Progress: 90% - Calculating credits
-            await manager.send_progress(project_id, 90, "Calculating credits and saving...")
-            
-            total_duration = sum(clip.get('videoMsDuration', clip.get('duration', 0)) / 1000 for clip in clip_res['videos'])
-            total_credits = int(total_duration // 60)
-            
-            # Store in database
-            clips_stored_id = store_in_db(
-                req, 
-                clip_res["videos"], 
-                total_credits, 
-                main_video_duration=round(total_duration)
-            )
-            
-            if not clips_stored_id:
-                error_msg = "Failed to save clips to database"
-                await manager.send_error(project_id, error_msg, "DB_SAVE_FAILED")
-                if not future.done():
-                    future.set_exception(Exception(error_msg))
-                del pending_clips[actual_key]
-                return {"status": "error", "message": error_msg}
-            
-            # Prepare final result
-            result = {
-                "status": "done",
-                "project_id": project_id,
-                "clip_count": len(clip_res['videos']),
-                "credit_usage": total_credits,
-                "clip_stored_id": clips_stored_id,
-                "total_duration": total_duration,
-                "clips": clip_res['videos']
-            }
-            
-            # Progress: 100% - Send final result
-            await manager.send_result(project_id, result)
-            
-            # Resolve future
+        if not clips_stored_id:
+            error_msg = "Failed to save clips to database"
+            await manager.send_error(project_id, error_msg, "DB_SAVE_FAILED")
             if not future.done():
-                future.set_result(result)
-            
-            # Cleanup
-            del pending_clips[actual_key]
-            
-            return {
-                "status": "success", 
-                "project_id": project_id,
-                "clips_stored": clips_stored_id
-            }
-            
-        except Exception as e:
-            print(f"❌ Webhook processing error: {e}")
+                future.set_exception(Exception(error_msg))
+            release_pending(actual_key)
+            raise Exception(error_msg)
+        
+        # Prepare final result
+        result = {
+            "status": "done",
+            "project_id": project_id,
+            "clip_count": len(clip_res['videos']),
+            "credit_usage": total_credits,
+            "clip_stored_id": clips_stored_id,
+            "total_duration": total_duration,
+            "clips": clip_res['videos']
+        }
+        
+        # Progress: 100% - Send final result
+        idempotency_store.complete(task_data.get('idempotency_key'), actual_key, result)
+        await manager.send_result(project_id, result)
+        job_queue.update(project_id, progress=100, message="Completed", clip_count=result["clip_count"])
+        
+        # Resolve future
+        if not future.done():
+            future.set_result(result)
+        
+        # Cleanup
+        pending_clips.pop(actual_key, None)
+        
+    except Exception as e:
+        print(f"❌ Webhook processing error: {e}")
+        if actual_key in pending_clips:
             error_msg = f"Processing failed: {str(e)}"
             await manager.send_error(project_id, error_msg, "PROCESSING_ERROR")
             
             if not future.done():
                 future.set_exception(e)
-            if actual_key and actual_key in pending_clips:
-                del pending_clips[actual_key]
-                
-            return {"status": "failed", "error": str(e)}
+            release_pending(actual_key)
+        raise
+
+
+async def accept_vizard_result(project_id, data: dict, source: str) -> dict:
+    """
+    Queue a finished Vizard project for processing. Shared by the webhook and the
+    polling reconciler; whichever arrives second is reported as already processed.
+    """
+    # Find actual key in pending_clips
+    actual_key = find_project_in_pending(project_id)
+    
+    # Check if task was cancelled
+    if consume_cancellation(project_id, actual_key):
+        print(f"⚠️ Result for cancelled task: {project_id}")
+        return {"status": "task_was_cancelled"}
+    
+    # Check if task exists
+    if actual_key is None:
+        print(f"⚠️ Unknown project: {project_id}")
+        return {"status": "project_not_found"}
+    
+    task_data = pending_clips[actual_key]
+    if task_data['future'].done() or task_data.get('result_received'):
+        return {"status": "already_processed"}
+    task_data['result_received'] = True
+    task_data['result_received_at'] = time.time()
+    task_data['result_source'] = source
+    
+    job = job_queue.enqueue(project_id, process_vizard_result, project_id, actual_key, data)
+    task_data['job_id'] = job['job_id']
+
+    await manager.send_progress(
+        project_id,
+        45,
+        f"Clips received, queued for processing (position {job['position']})"
+    )
+
+    return {
+        "status": "queued",
+        "project_id": project_id,
+        "job_id": job['job_id'],
+        "queue_depth": job['position']
+    }
+
+
+async def fail_pending_project(project_id, actual_key, message: str, error_code: str = "VIZARD_TIMEOUT"):
+    """
+    Give up on a pending project. error_code tells clients why: VIZARD_TIMEOUT
+    (no answer from Vizard) or VIZARD_FAILED (Vizard rejected the video).
+    """
+    task_data = release_pending(actual_key)
+    if task_data is None:
+        return
+    print(f"❌ {project_id}: {message}")
+    await manager.send_error(project_id, message, error_code)
+    if not task_data['future'].done():
+        task_data['future'].set_exception(Exception(message))
+
+
+@router.post("/webhook/vizard", tags=["Webhooks"])
+async def receive_vizard_webhook(request: Request):
+    """
+    Receive webhook from Vizard when processing completes.
+    Validates and queues the render job, then acknowledges immediately.
+    """
+    try:
+        data = await request.json()
+        print("📩 Vizard webhook received:", data.get("projectId"))
+
+        project_id = data.get("projectId")
+        code = data.get("code")
+        
+        if code != 2000 or not project_id:
+            return {"status": "ignored", "reason": "Invalid webhook data"}
+        
+        return await accept_vizard_result(project_id, data, "webhook")
         
     except Exception as e:
         print(f"❌ Webhook error: {e}")
         return {"status": "failed", "error": str(e)}
 
 
+@router.get("/jobs", tags=["Video Processing"])
+async def get_job_queue_stats():
+    """Render queue depth and job counts by state"""
+    return job_queue.get_stats()
+
+
+@router.get("/jobs/{job_id}", tags=["Video Processing"])
+async def get_job_state(job_id: str):
+    """State and last progress of one render job"""
+    job = job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/media-probe", tags=["Video Processing"])
+async def get_media_probe_stats():
+    """Remote source probes: header-only vs ffprobe fallbacks, cache hits and bytes read"""
+    return get_remote_probe_stats()
+
+
+@router.get("/template-cache", tags=["Video Processing"])
+async def get_template_cache_stats():
+    return template_cache.get_stats()
+
+
+@router.post("/templates/{template_id}/invalidate", tags=["Video Processing"])
+async def invalidate_template(template_id: str):
+    """Called by the backend after a template is edited, so the next /generate refetches it"""
+    removed = template_cache.invalidate(template_id)
+    print(f"🗑️ Template {template_id} invalidated ({removed} cached entr{'y' if removed == 1 else 'ies'})")
+    return {"template_id": template_id, "removed": removed}
+
+
+@router.get("/idempotency", tags=["Video Processing"])
+async def get_idempotency_stats():
+    """Duplicate /generate submissions coalesced or replayed"""
+    return idempotency_store.get_stats()
+
+
+@router.get("/reconciler", tags=["Video Processing"])
+async def get_reconciler_stats():
+    """Polling fallback for lost webhooks: polls made and projects recovered"""
+    return reconciler.get_stats()
+
+
+@router.get("/metrics/template-prep", tags=["Video Processing"])
+async def get_template_prep_metrics():
+    """Speculative template preparation: jobs served and webhook-to-result seconds saved"""
+    used = template_prep_stats["used"]
+    return {
+        **template_prep_stats,
+        "seconds_saved_total": round(template_prep_stats["seconds_saved_total"], 2),
+        "seconds_saved_avg": round(template_prep_stats["seconds_saved_total"] / used, 2) if used else None
+    }
+
+
+@router.get("/render-cache", tags=["Video Processing"])
+async def get_render_cache_stats():
+    """Render cache entries and hit/miss counts"""
+    return await asyncio.to_thread(render_cache.get_stats)
+
+
+@router.delete("/render-cache", tags=["Video Processing"])
+async def invalidate_render_cache(asset_url: Optional[str] = None, video_id: Optional[str] = None):
+    """Drop cached renders built from a template asset URL and/or of one Vizard videoId"""
+    if not asset_url and not video_id:
+        raise HTTPException(status_code=400, detail="asset_url or video_id is required")
+    removed = 0
+    if asset_url:
+        removed += await asyncio.to_thread(render_cache.invalidate_asset, asset_url)
+    if video_id:
+        removed += await asyncio.to_thread(render_cache.invalidate_video, video_id)
+    return {"removed": removed}
+
+
 @router.post("/cancel/{project_id}", tags=["Video Processing"])
 async def cancel_task(project_id: str):
     """Cancel a running task"""
@@ -669,6 +947,9 @@ async def cancel_task(project_id: str):
     # Mark as cancelled
     cancelled_tasks.add(project_id)
     
+    # Drop it from the render queue if it hasn't started yet
+    job_queue.cancel(project_id)
+
     # Cancel future
     task_data = pending_clips[project_id]
     future = task_data['future']
@@ -678,9 +959,8 @@ async def cancel_task(project_id: str):
     # Notify via WebSocket
     await manager.send_cancelled(project_id)
     
-    # Cleanup
-    del pending_clips[project_id]
-    manager.disconnect(project_id)
+    # Cleanup (each WebSocket unsubscribes itself once the client closes)
+    release_pending(project_id)
     
     return {
         "status": "cancelled",
@@ -6,6 +6,14 @@ from PIL import Image
 # Global GPU availability cache
 _GPU_AVAILABLE = None
 
+# Overlay position mapping
+LOGO_POSITIONS = {
+    "top-right": "overlay=W-w-10:10",
+    "top-left": "overlay=10:10",
+    "bottom-right": "overlay=W-w-10:H-h-10",
+    "bottom-left": "overlay=10:H-h-10"
+}
+
 def check_gpu_available():
     """Check if GPU encoding is available"""
     global _GPU_AVAILABLE
@@ -34,32 +42,28 @@ def convert_to_png(input_path, output_path):
     print(f"✅ Converted to PNG: {os.path.basename(output_path)}")
 
 
-def AddLogo(input_path, logo_path, output_path, position="top-right", logo_width=150):
+def AddLogo(input_path, logo_path, output_path, position="top-right", logo_width=150, threads=None):
     """
     Add logo to video with automatic GPU/CPU fallback
     - Tries GPU (h264_nvenc) first
     - Falls back to CPU (libx264) if GPU fails
+    - threads limits libx264 threads (None lets x264 use every core)
     """
+    thread_args = ["-threads", str(threads)] if threads else []
     
     # Ensure logo is PNG RGBA
     logo_ext = os.path.splitext(logo_path)[1].lower()
     png_logo = None
     
     if logo_ext != ".png":
-        png_logo = os.path.join(DATA_DIR, "temp_logo.png")
+        # Per-output temp name so concurrent clips don't share (and delete) one file
+        png_logo = os.path.splitext(output_path)[0] + "_logo.png"
         convert_to_png(logo_path, png_logo)
         logo_to_use = png_logo
     else:
         logo_to_use = logo_path
 
-    # Overlay position mapping
-    positions = {
-        "top-right": "overlay=W-w-10:10",
-        "top-left": "overlay=10:10",
-        "bottom-right": "overlay=W-w-10:H-h-10",
-        "bottom-left": "overlay=10:H-h-10"
-    }
-    overlay_pos = positions.get(position, "overlay=W-w-10:10")
+    overlay_pos = LOGO_POSITIONS.get(position, LOGO_POSITIONS["top-right"])
 
     # Check GPU availability
     use_gpu = check_gpu_available()
@@ -94,6 +98,7 @@ def AddLogo(input_path, logo_path, output_path, position="top-right", logo_width
             "-c:v", "libx264",
             "-preset", "medium",
             "-crf", "23",
+            *thread_args,
             "-c:a", "aac",
             "-b:a", "192k",
             "-ar", "44100",
@@ -133,6 +138,7 @@ def AddLogo(input_path, logo_path, output_path, position="top-right", logo_width
                 "-c:v", "libx264",
                 "-preset", "medium",
                 "-crf", "23",
+                *thread_args,
                 "-c:a", "aac",
                 "-b:a", "192k",
                 "-ar", "44100",
@@ -1,8 +1,18 @@
 import os
+import shutil
+import tempfile
+import time
 import requests
-from app.config import DATA_DIR, MERGE_DIR
-from app.services.intro_outro import Add_intro_outro_logo, convert_to_same_format
+from app.config import DATA_DIR, MERGE_DIR, RENDER_MODE, ASSET_CACHE_ENABLED, RENDER_CACHE_ENABLED
+from app.services.intro_outro import (
+    Add_intro_outro_logo, convert_to_same_format, add_silent_audio_if_missing, get_encoder_profile
+)
 from app.services.download_file import Download_File
+from app.services.asset_cache import asset_cache, get_source_fingerprint
+from app.services.render_cache import render_cache, make_template_key
+
+# AddLogo / single-pass default placement, part of the render cache key
+TEMPLATE_LOGO_POSITION = "top-right"
 
 # def download_file(url, save_path):
 #     """Download a file from a URL and save it locally."""
@@ -16,55 +26,183 @@ from app.services.download_file import Download_File
 def safe_remove(path):
     """Safely remove a file if it exists."""
     try:
-        if os.path.exists(path):
+        if path and os.path.exists(path):
             os.remove(path)
     except Exception as e:
         print(f"Could not delete {path}: {e}")
 
-def Add_Template(clips_info, ratio, intro_url, outro_url, logo_url):
+def get_target_resolution(ratio):
+    """Map an aspect ratio label like "9:16" to the output resolution"""
+    if ratio == "9:16":
+        return 1080, 1920
+    elif ratio == "16:9":
+        return 1920, 1080
+    elif ratio == "1:1":
+        return 1080, 1080
+    elif ratio == "4:3":
+        return 1024, 768
+
+    ratio_parts = ratio.split(":")
+    width_ratio = int(ratio_parts[0])
+    height_ratio = int(ratio_parts[1])
+    target_width = 1080
+    return target_width, int(target_width * height_ratio / width_ratio)
+
+def get_normalized_asset(url, target_width, target_height, target_fps=30):
+    """
+    Return a cached intro/outro already converted to the target format with an
+    audio track, downloading and normalizing it only on a cache miss.
+    The returned path is pinned; release it with asset_cache.release().
+    """
+    key = asset_cache.make_key(
+        url=url,
+        fingerprint=get_source_fingerprint(url),
+        width=target_width,
+        height=target_height,
+        fps=target_fps,
+        profile=get_encoder_profile()
+    )
+
+    def build(output_path):
+        src_path = Download_File(url, os.path.dirname(output_path))
+        conv_path = os.path.splitext(output_path)[0] + "_conv.mp4"
+        try:
+            convert_to_same_format(src_path, conv_path, target_width, target_height, target_fps)
+            add_silent_audio_if_missing(conv_path, output_path)
+        finally:
+            safe_remove(src_path)
+            safe_remove(conv_path)
+
+    return asset_cache.get_or_create(key, build)
+
+def prepare_template_assets(ratio, intro_url=None, outro_url=None):
+    """
+    Normalize a template's intro/outro into the asset cache ahead of time (e.g. while
+    Vizard is still generating clips), so Add_Template later gets cache hits.
+    Entries stay protected from eviction by the cache's grace window.
+    Returns (started, finished) timestamps.
+    """
+    started = time.time()
+    target_width, target_height = get_target_resolution(ratio)
+    for url in (intro_url, outro_url):
+        if url:
+            asset_cache.release(get_normalized_asset(url, target_width, target_height))
+    return started, time.time()
+
+def get_template_key(intro_url, outro_url, logo_url, ratio, render_mode):
+    """
+    Identity of a template rendering: asset fingerprints (ETag / Last-Modified),
+    so replacing an asset at the same URL changes the key, plus everything else
+    that changes the output.
+    """
+    def fingerprint(url):
+        # Missing components have nothing to fingerprint (and nothing to HEAD)
+        return [url, get_source_fingerprint(url)] if url else None
+
+    return make_template_key(
+        intro=fingerprint(intro_url),
+        outro=fingerprint(outro_url),
+        logo=fingerprint(logo_url),
+        ratio=ratio,
+        logo_position=TEMPLATE_LOGO_POSITION,
+        render_mode=render_mode,
+        profile=get_encoder_profile()
+    )
+
+def Add_Template(clips_info, ratio, intro_url, outro_url, logo_url, render_mode=None):
+    """
+    Render intro + clip + outro + logo for every clip, updating videoUrl / duration.
+    Clips already rendered with the same template come from the render cache.
+    """
+    render_mode = render_mode or RENDER_MODE
+    if not RENDER_CACHE_ENABLED:
+        return render_template(clips_info, ratio, intro_url, outro_url, logo_url, render_mode)
+
+    template_key = get_template_key(intro_url, outro_url, logo_url, ratio, render_mode)
+    hits = []
+    misses = []
+    for clip in clips_info:
+        cached = render_cache.get(clip.get("videoId"), template_key)
+        if cached:
+            hits.append((clip, cached))
+        else:
+            misses.append(clip)
+
+    print(f"♻️ Render cache: {len(hits)} hits, {len(misses)} to render")
+
+    if misses:
+        # The source URL is replaced by the rendered one, keep the ids to index results
+        video_ids = [clip.get("videoId") for clip in misses]
+        render_template(misses, ratio, intro_url, outro_url, logo_url, render_mode)
+
+        for video_id, clip in zip(video_ids, misses):
+            if clip.get("videoUrl"):
+                render_cache.put(
+                    video_id, template_key, clip["videoUrl"], clip.get("duration"),
+                    intro_url=intro_url, outro_url=outro_url, logo_url=logo_url
+                )
+
+    # Only once the misses rendered: if that raises, no clip has the template
+    # (rather than a mix of cached templated clips and untemplated ones)
+    for clip, cached in hits:
+        clip.update(cached)
+    return clips_info
+
+def render_template(clips_info, ratio, intro_url, outro_url, logo_url, render_mode):
     # Ensure directories exist
     os.makedirs(DATA_DIR, exist_ok=True)
     os.makedirs(MERGE_DIR, exist_ok=True)
 
+    # Private working directory so concurrent jobs never share temp file names
+    work_dir = tempfile.mkdtemp(prefix="job_", dir=MERGE_DIR)
+
     intro_path = None
     outro_path = None
     logo_path = None
     intro_conv = None
     outro_conv = None
+    intro_cached = None
+    outro_cached = None
 
     try:
+        # Determine target resolution
+        target_width, target_height = get_target_resolution(ratio)
+        print(f"Target resolution: {target_width}x{target_height} ({ratio})")
+
+        if ASSET_CACHE_ENABLED:
+            # Normalized intro/outro come from the cache; a hit skips straight to per-clip work
+            print("Preparing intro video (cached)...")
+            intro_cached = get_normalized_asset(intro_url, target_width, target_height)
+            print("Preparing outro video (cached)...")
+            outro_cached = get_normalized_asset(outro_url, target_width, target_height)
+            print("Downloading logo image...")
+            logo_path = Download_File(logo_url, work_dir)
+
+            clips = Add_intro_outro_logo(
+                clips_info, intro_cached, outro_cached, target_width, target_height, logo_path,
+                render_mode=render_mode, intro_outro_ready=True, work_dir=work_dir
+            )
+            return clips
 
         # Download files from URLs
         print("Downloading intro video...")
-        intro_path = Download_File(intro_url, DATA_DIR)
+        intro_path = Download_File(intro_url, work_dir)
         print("Downloading outro video...")
-        outro_path = Download_File(outro_url, DATA_DIR)
+        outro_path = Download_File(outro_url, work_dir)
         print("Downloading logo image...")
-        logo_path = Download_File(logo_url, DATA_DIR)
-
-        # Parse user-specified ratio
-        ratio_parts = ratio.split(":")
-        width_ratio = int(ratio_parts[0])
-        height_ratio = int(ratio_parts[1])
-
-        # Determine target resolution
-        if ratio == "9:16":
-            target_width, target_height = 1080, 1920
-        elif ratio == "16:9":
-            target_width, target_height = 1920, 1080
-        elif ratio == "1:1":
-            target_width, target_height = 1080, 1080
-        elif ratio == "4:3":
-            target_width, target_height = 1024, 768
-        else:
-            target_width = 1080
-            target_height = int(target_width * height_ratio / width_ratio)
+        logo_path = Download_File(logo_url, work_dir)
 
-        print(f"Target resolution: {target_width}x{target_height} ({ratio})")
+        if render_mode == "single_pass":
+            # Single pass scales intro/outro inside the per-clip filtergraph
+            clips = Add_intro_outro_logo(
+                clips_info, intro_path, outro_path, target_width, target_height, logo_path,
+                render_mode=render_mode, work_dir=work_dir
+            )
+            return clips
 
         # Convert intro and outro to target format
-        intro_conv = os.path.join(MERGE_DIR, "intro_conv.mp4")
-        outro_conv = os.path.join(MERGE_DIR, "outro_conv.mp4")
+        intro_conv = os.path.join(work_dir, "intro_conv.mp4")
+        outro_conv = os.path.join(work_dir, "outro_conv.mp4")
 
         print("Converting intro...")
         convert_to_same_format(intro_path, intro_conv, target_width, target_height)
@@ -73,7 +211,10 @@ def Add_Template(clips_info, ratio, intro_url, outro_url, logo_url):
         convert_to_same_format(outro_path, outro_conv, target_width, target_height)
 
         # Merge intro, outro, and clips
-        clips = Add_intro_outro_logo(clips_info, intro_conv, outro_conv, target_width, target_height, logo_path)
+        clips = Add_intro_outro_logo(
+            clips_info, intro_conv, outro_conv, target_width, target_height, logo_path,
+            render_mode=render_mode, work_dir=work_dir
+        )
         # os.remove(intro_path)
         # os.remove(outro_path)
         # os.remove(logo_path)
@@ -86,10 +227,15 @@ def Add_Template(clips_info, ratio, intro_url, outro_url, logo_url):
     finally:
         print("🧹 Cleaning up downloaded & temp files...")
 
+        # Cached intro/outro stay on disk for the next job
+        asset_cache.release(intro_cached)
+        asset_cache.release(outro_cached)
+
         safe_remove(intro_path)
         safe_remove(outro_path)
         safe_remove(logo_path)
         safe_remove(intro_conv)
         safe_remove(outro_conv)
+        shutil.rmtree(work_dir, ignore_errors=True)
 
-        print("Cleanup complete.")
\ No newline at end of file
+        print("Cleanup complete.")
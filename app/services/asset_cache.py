@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from app.services.download_file import http_session
+from app.config import ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES, ASSET_CACHE_GRACE_SECONDS
+
+
+def get_source_fingerprint(url, timeout=10):
+    """
+    Cheap identity of a remote file (ETag, or Last-Modified + size) via HEAD.
+    Returns None if the server gives nothing usable; the URL alone is then the key.
+    """
+    try:
+        r = http_session.head(url, allow_redirects=True, timeout=timeout)
+        if r.status_code >= 400:
+            return None
+        etag = r.headers.get("ETag")
+        if etag:
+            return f"etag:{etag}"
+        last_modified = r.headers.get("Last-Modified")
+        if last_modified:
+            return f"lm:{last_modified}:{r.headers.get('Content-Length', '')}"
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ HEAD failed for {url}: {e}")
+    return None
+
+
+class AssetCache:
+    """
+    Content-addressed on-disk cache with byte-budget LRU eviction.
+
+    Entries are published with an atomic rename, so concurrent readers never see
+    a partial file. Builds of the same key in one process are serialized; entries
+    pinned by a running job (or touched within the grace window) are never evicted.
+    """
+
+    def __init__(self, cache_dir, max_bytes, grace_seconds=0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pins = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """Stable hash of the parts that define an entry"""
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key, ext):
+        return os.path.join(self.cache_dir, key[:2], f"{key}{ext}")
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def get(self, key, ext=".mp4"):
+        """Return the cached path (and mark it recently used) or None"""
+        path = self._entry_path(key, ext)
+        if os.path.exists(path):
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            return path
+        return None
+
+    def get_or_create(self, key, builder, ext=".mp4"):
+        """
+        Return a pinned path for key, calling builder(tmp_path) on a miss.
+        Call release(path) when the caller is done with it.
+        """
+        with self._key_lock(key):
+            path = self.get(key, ext)
+            if path:
+                self.hits += 1
+                print(f"♻️ Asset cache hit: {os.path.basename(path)}")
+            else:
+                self.misses += 1
+                path = self._entry_path(key, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Keep the real extension last so ffmpeg can infer the container
+                tmp_path = f"{path[:-len(ext)]}.{os.getpid()}.{threading.get_ident()}.tmp{ext}"
+                try:
+                    builder(tmp_path)
+                    os.replace(tmp_path, path)
+                    print(f"💾 Asset cached: {os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB)")
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            self._pin(path)
+
+        self.evict()
+        return path
+
+    def _pin(self, path):
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def release(self, path):
+        """Unpin a path returned by get_or_create"""
+        if not path:
+            return
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if ".tmp" in name:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits the byte budget"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with self._lock:
+                pinned = path in self._pins
+            if pinned or now - mtime < self.grace_seconds:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                print(f"🗑️ Evicted cached asset: {os.path.basename(path)}")
+            except OSError as e:
+                print(f"⚠️ Evict failed: {e}")
+
+    def get_stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pinned": len(self._pins)
+        }
+
+
+# Global instance
+asset_cache = AssetCache(ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES, ASSET_CACHE_GRACE_SECONDS)
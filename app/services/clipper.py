@@ -1,22 +1,14 @@
-import requests
-from app.config import VIZARD_API_KEY
-import json 
+from app.services.vizard_client import vizard_client, ProjectQueryResponse
 
-async def run_clip_generation(project_id):
-    url = f"https://elb-api.vizard.ai/hvizard-server-front/open-api/v1/project/query/{project_id}"
-    headers = {
-        "Content-Type": "application/json",
-        "VIZARDAI_API_KEY": VIZARD_API_KEY
-    }
-    response = requests.get(url, headers=headers)
-
-    return json.loads(response.text)
+async def run_clip_generation(project_id) -> ProjectQueryResponse:
+    """Query a Vizard project; .is_processing until clips are ready, then .videos"""
+    return await vizard_client.query_project(project_id)
 
 
 
 async def main():
     res = await run_clip_generation('23176124')
-    print("response------------", res['videos'])
+    print("response------------", res.videos)
 import asyncio
 if __name__=='__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from app.config import (
+    CLOUDINARY_UPLOAD_URL, UPLOAD_CHUNK_SIZE, UPLOAD_WORKERS, UPLOAD_CHUNK_RETRIES,
+    UPLOAD_TIMEOUT, DOWNLOAD_CONNECT_TIMEOUT, api_key, api_secret
+)
+from app.services.download_file import http_session
+
+
+class UploadError(Exception):
+    """A chunk was rejected or kept failing after retries"""
+    pass
+
+
+def sign_params(params, secret):
+    """Cloudinary signature: sha1 of the sorted 'key=value&...' string followed by the API secret"""
+    to_sign = "&".join(f"{key}={params[key]}" for key in sorted(params))
+    return hashlib.sha1((to_sign + secret).encode("utf-8")).hexdigest()
+
+
+class CloudUploader:
+    """
+    Chunked (upload_large-style) video uploads to Cloudinary.
+
+    Each file is sent as sequential Content-Range chunks sharing one
+    X-Unique-Upload-Id; a failed chunk is retried on its own instead of
+    restarting the file. Uploads run on a bounded pool shared by every job,
+    over the shared keep-alive HTTP session.
+    """
+
+    def __init__(self, upload_url=CLOUDINARY_UPLOAD_URL, workers=UPLOAD_WORKERS,
+                 chunk_size=UPLOAD_CHUNK_SIZE, retries=UPLOAD_CHUNK_RETRIES, session=None):
+        self.upload_url = upload_url
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.session = session or http_session
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+
+    def _signed_params(self, folder):
+        params = {"timestamp": int(time.time())}
+        if folder:
+            params["folder"] = folder
+        params["signature"] = sign_params(params, api_secret or "")
+        params["api_key"] = api_key
+        return params
+
+    def _send_chunk(self, path, data, start, total, upload_id, folder):
+        end = start + len(data) - 1
+        headers = {"X-Unique-Upload-Id": upload_id, "Content-Range": f"bytes {start}-{end}/{total}"}
+
+        for attempt in range(self.retries + 1):
+            try:
+                r = self.session.post(
+                    self.upload_url,
+                    # Signed per request: a long upload (or its retries) must not outlive the signature
+                    data=self._signed_params(folder),
+                    files={"file": (os.path.basename(path), data, "application/octet-stream")},
+                    headers=headers,
+                    timeout=(DOWNLOAD_CONNECT_TIMEOUT, UPLOAD_TIMEOUT)
+                )
+                if r.status_code < 400:
+                    return r.json()
+                if r.status_code not in (408, 420, 429) and r.status_code < 500:
+                    # Bad signature, invalid file... retrying will not help
+                    raise UploadError(f"Chunk {start}-{end} rejected ({r.status_code}): {r.text[:200]}")
+                error = f"HTTP {r.status_code}"
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+
+            if attempt < self.retries:
+                wait = 0.5 * 2 ** attempt
+                print(f"⚠️ Upload chunk {start}-{end} failed ({error}), retrying in {wait:.1f}s")
+                time.sleep(wait)
+
+        raise UploadError(f"Chunk {start}-{end} of {path} failed after {self.retries + 1} attempts: {error}")
+
+    def upload_file(self, path, folder="reels"):
+        """
+        Upload one file in chunks on the calling thread.
+        Returns the final Cloudinary response plus upload_seconds / bytes_per_second.
+        """
+        total = os.path.getsize(path)
+        upload_id = uuid.uuid4().hex
+        start_time = time.perf_counter()
+
+        response = None
+        with open(path, "rb") as f:
+            offset = 0
+            while True:
+                data = f.read(self.chunk_size)
+                response = self._send_chunk(path, data, offset, total, upload_id, folder)
+                offset += len(data)
+                if offset >= total:
+                    break
+
+        if not response or "secure_url" not in response:
+            raise UploadError(f"Upload of {path} finished without a secure_url: {response}")
+
+        seconds = max(time.perf_counter() - start_time, 1e-6)
+        response["upload_seconds"] = round(seconds, 2)
+        response["bytes_per_second"] = round(total / seconds)
+        print(f"☁️ Uploaded {os.path.basename(path)}: {total / 1024 / 1024:.1f} MB in {seconds:.1f}s "
+              f"({total / 1024 / 1024 / seconds:.1f} MB/s)")
+        return response
+
+    def submit(self, path, folder="reels"):
+        """Queue an upload on the shared pool; returns a Future of upload_file's result"""
+        return self.executor.submit(self.upload_file, path, folder)
+
+    def upload(self, path, folder="reels"):
+        """Upload through the bounded pool and wait for the result"""
+        return self.submit(path, folder).result()
+
+
+# Global uploader shared by all render jobs
+cloud_uploader = CloudUploader()
+
+
+# --------------------
+# Local stand-in for the Cloudinary upload endpoint:
+#   python -m app.services.cloud_upload --serve [port] [fail_every]
+# then point CLOUDINARY_UPLOAD_URL at http://127.0.0.1:<port>/v1_1/demo/video/upload and run
+#   python -m app.services.cloud_upload <file> [<file> ...]
+
+def run_stand_in_server(port=8799, fail_every=0, storage_dir="/tmp/cloud_upload_stand_in"):
+    """
+    Accepts chunked uploads like Cloudinary: multipart POST with a 'file' part,
+    Content-Range and X-Unique-Upload-Id. Checks the signature when API_SECRET is set.
+    fail_every=N answers every Nth request with a 500 to exercise chunk retries.
+    """
+    import threading
+    from email import policy
+    from email.parser import BytesParser
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    os.makedirs(storage_dir, exist_ok=True)
+    counter = {"requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                counter["requests"] += 1
+                fail = fail_every and counter["requests"] % fail_every == 0
+            if fail:
+                return self._reply(500, {"error": {"message": "simulated failure"}})
+
+            message = BytesParser(policy=policy.HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+            )
+            fields, chunk = {}, b""
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if name == "file":
+                    chunk = part.get_payload(decode=True)
+                else:
+                    fields[name] = part.get_payload(decode=True).decode("utf-8")
+
+            signature = fields.pop("signature", "")
+            fields.pop("api_key", None)
+            if api_secret and signature != sign_params(fields, api_secret):
+                return self._reply(401, {"error": {"message": "Invalid Signature"}})
+
+            upload_id = self.headers.get("X-Unique-Upload-Id", uuid.uuid4().hex)
+            start, end, total = 0, len(chunk) - 1, len(chunk)
+            content_range = self.headers.get("Content-Range")
+            if content_range:
+                span, total = content_range.replace("bytes ", "").split("/")
+                start, end = (int(n) for n in span.split("-"))
+                total = int(total)
+
+            target = os.path.join(storage_dir, f"{upload_id}.mp4")
+            with lock:
+                with open(target, "r+b" if os.path.exists(target) else "wb") as f:
+                    f.seek(start)
+                    f.write(chunk)
+
+            if end + 1 < total:
+                return self._reply(200, {"done": False, "bytes": end + 1})
+            self._reply(200, {
+                "public_id": f"{fields.get('folder', '')}/{upload_id}".strip("/"),
+                "bytes": total,
+                "resource_type": "video",
+                "secure_url": f"http://127.0.0.1:{port}/{os.path.basename(target)}"
+            })
+
+    print(f"🧪 Cloudinary stand-in on http://127.0.0.1:{port}/v1_1/demo/video/upload -> {storage_dir}")
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8799
+        fail_every = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        run_stand_in_server(port, fail_every)
+    else:
+        start = time.perf_counter()
+        futures = [cloud_uploader.submit(path) for path in sys.argv[1:]]
+        for future in futures:
+            print(future.result()["secure_url"])
+        total = sum(os.path.getsize(path) for path in sys.argv[1:])
+        seconds = time.perf_counter() - start
+        print(f"Total: {total / 1024 / 1024:.1f} MB in {seconds:.1f}s ({total / 1024 / 1024 / seconds:.1f} MB/s)")
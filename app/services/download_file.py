@@ -1,41 +1,342 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlparse
 import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from app.config import (
+    DOWNLOAD_POOL_SIZE, DOWNLOAD_RETRIES, DOWNLOAD_CONNECT_TIMEOUT,
+    DOWNLOAD_READ_TIMEOUT, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MODE, DOWNLOAD_RANGE_PARTS,
+    DOWNLOAD_RANGE_MIN_BYTES, DOWNLOAD_PARTIAL_DIR
+)
 
-def Download_File(url, file_path):
+DOWNLOAD_TIMEOUT = (DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
+
+
+def create_session(pool_size=DOWNLOAD_POOL_SIZE, retries=DOWNLOAD_RETRIES):
+    """
+    requests.Session with a keep-alive connection pool per host and retries on
+    connection errors and transient status codes (before the body is read).
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared by every download in this process (thread-safe for concurrent GETs)
+http_session = create_session()
+
+
+def make_download_name(url):
+    """Unique local file name keeping the remote base name and extension"""
+    filename = os.path.basename(urlparse(url).path)
+    name, ext = os.path.splitext(filename)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # The random suffix keeps concurrent downloads of the same URL apart
+    return f"{name or 'download'}_{timestamp}_{uuid.uuid4().hex[:8]}{ext}"
+
+
+def stream_to_file(url, save_path, session=None, chunk_size=DOWNLOAD_CHUNK_SIZE, timeout=DOWNLOAD_TIMEOUT):
+    """
+    Stream url into save_path chunk by chunk; memory use is one chunk whatever the size.
+    Writes to a .part file and renames it on success, so save_path is never partial.
+    Returns the number of bytes written.
+    """
+    session = session or http_session
+    part_path = save_path + ".part"
+    written = 0
+    try:
+        with session.get(url, stream=True, timeout=timeout) as r:
+            r.raise_for_status()
+            expected = r.headers.get("Content-Length")
+            with open(part_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+            # Only meaningful without Content-Encoding (requests decodes gzip transparently)
+            if expected and not r.headers.get("Content-Encoding") and written != int(expected):
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"Incomplete download: {written} of {expected} bytes"
+                )
+        os.replace(part_path, save_path)
+        return written
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+
+class SourceChangedError(Exception):
+    """The remote file changed between ranged requests; partial data is discarded"""
+    pass
+
+
+def probe_ranges(url, session=None, timeout=DOWNLOAD_TIMEOUT):
+    """
+    Ask for the first byte to learn whether the server serves byte ranges.
+    Returns (total size, validator) or (None, None) when ranges are not supported.
+    """
+    session = session or http_session
+    headers = {"Range": "bytes=0-0", "Accept-Encoding": "identity"}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        content_range = r.headers.get("Content-Range", "")
+        if r.status_code != 206 or "/" not in content_range:
+            return None, None
+        total = content_range.rsplit("/", 1)[1]
+        if not total.isdigit():
+            return None, None
+        return int(total), r.headers.get("ETag") or r.headers.get("Last-Modified")
+
+
+def lock_file(f):
+    """
+    Block until f holds an exclusive cross-process lock: flock on POSIX,
+    msvcrt.locking on Windows (where fcntl does not exist).
+    """
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after ~10 s of retries; keep waiting
+                continue
+    fcntl.flock(f, fcntl.LOCK_EX)
+
+
+def unlock_file(f):
+    """Release lock_file(f) and close f"""
+    try:
+        import msvcrt
+    except ImportError:
+        pass
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    f.close()
+
+
+class RangedDownload:
+    """
+    Download one URL as N concurrent byte ranges into a preallocated file.
+
+    Progress of every range is kept in a JSON sidecar next to the partial file
+    (both named by the URL hash in DOWNLOAD_PARTIAL_DIR), so an interrupted
+    download resumes from where each range stopped. If-Range with the ETag /
+    Last-Modified validator guarantees resumed bytes come from the same version.
+    """
+
+    def __init__(self, url, size, validator, parts=DOWNLOAD_RANGE_PARTS, session=None):
+        self.url = url
+        self.size = size
+        self.validator = validator
+        self.session = session or http_session
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        os.makedirs(DOWNLOAD_PARTIAL_DIR, exist_ok=True)
+        self.part_path = os.path.join(DOWNLOAD_PARTIAL_DIR, key + ".part")
+        self.state_path = os.path.join(DOWNLOAD_PARTIAL_DIR, key + ".json")
+        self.lock_path = os.path.join(DOWNLOAD_PARTIAL_DIR, key + ".lock")
+        self.parts = max(1, parts)
+        self.ranges = []
+        self.resumed_bytes = 0
+        self._state_lock = threading.Lock()
+
+    def _load_state(self):
+        """Resume matching progress, or start fresh with a preallocated file"""
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+            if (state["url"] == self.url and state["size"] == self.size
+                    and state["validator"] == self.validator and os.path.exists(self.part_path)
+                    and os.path.getsize(self.part_path) == self.size):
+                self.ranges = state["ranges"]
+                self.resumed_bytes = sum(r["done"] for r in self.ranges)
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        step = -(-self.size // self.parts)
+        self.ranges = [
+            {"start": start, "end": min(start + step, self.size) - 1, "done": 0}
+            for start in range(0, self.size, step)
+        ]
+        with open(self.part_path, "wb") as f:
+            f.truncate(self.size)
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, self.size)
+        self._save_state()
+
+    def _save_state(self):
+        with self._state_lock:
+            state = {"url": self.url, "size": self.size, "validator": self.validator, "ranges": self.ranges}
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+
+    def _discard(self):
+        for path in (self.part_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _fetch_range(self, byte_range):
+        start = byte_range["start"] + byte_range["done"]
+        if start > byte_range["end"]:
+            return
+        headers = {"Range": f"bytes={start}-{byte_range['end']}", "Accept-Encoding": "identity"}
+        if self.validator:
+            headers["If-Range"] = self.validator
+
+        unsaved = 0
+        with self.session.get(self.url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                # If-Range mismatch: the server sent the whole (new) file instead
+                raise SourceChangedError(f"{self.url} changed during download")
+            with open(self.part_path, "r+b") as f:
+                f.seek(start)
+                try:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        byte_range["done"] += len(chunk)
+                        unsaved += len(chunk)
+                        # Checkpoint progress every ~8 chunks
+                        if unsaved >= 8 * DOWNLOAD_CHUNK_SIZE:
+                            f.flush()
+                            self._save_state()
+                            unsaved = 0
+                finally:
+                    f.flush()
+        if byte_range["start"] + byte_range["done"] <= byte_range["end"]:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Range {byte_range['start']}-{byte_range['end']} ended early"
+            )
+
+    @contextmanager
+    def _locked(self):
+        """
+        Exclusive lock for this URL across threads and processes. The lock file is
+        removed after a completed download, so retry if it was replaced while waiting.
+        """
+        while True:
+            lock = open(self.lock_path, "a")
+            lock_file(lock)
+            try:
+                if os.fstat(lock.fileno()).st_ino == os.stat(self.lock_path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            unlock_file(lock)
+        try:
+            yield
+        finally:
+            unlock_file(lock)
+
+    def run(self, save_path):
+        """Fetch all missing ranges, then move the completed file to save_path"""
+        with self._locked():
+            self._load_state()
+            if self.resumed_bytes:
+                print(f"⏯️ Resuming {self.url} at {self.resumed_bytes / 1024 / 1024:.1f} MB")
+
+            try:
+                with ThreadPoolExecutor(max_workers=len(self.ranges)) as executor:
+                    futures = [executor.submit(self._fetch_range, r) for r in self.ranges]
+                    errors = [f.exception() for f in futures if f.exception()]
+            finally:
+                self._save_state()
+
+            if errors:
+                if any(isinstance(e, SourceChangedError) for e in errors):
+                    self._discard()
+                raise errors[0]
+
+            shutil.move(self.part_path, save_path)
+            os.remove(self.state_path)
+            try:
+                os.remove(self.lock_path)
+            except PermissionError:
+                # Windows cannot delete a file that is still open; it is reused next time
+                pass
+            return self.size - self.resumed_bytes
+
+
+def Download_File(url, file_path, retries=DOWNLOAD_RETRIES, mode=None):
+    """
+    Download url into file_path under a unique name and return the local path.
+    mode "auto" uses parallel ranges for large files when the server supports them,
+    "stream" always uses a single stream.
+    """
     # Validate URL
     if not url or not url.strip():
         raise ValueError("URL cannot be empty")
-    
+
     url = url.strip()
     if not url.startswith(('http://', 'https://')):
         raise ValueError(f"Invalid URL scheme: {url}")
-    
-    # Parse URL
-    parsed_url = urlparse(url)
-    # Get path part
-    path = parsed_url.path
-    # Extract filename
-    filename = os.path.basename(path)
-    print("Original filename:----", filename)
-    # Split filename and extension
-    name, ext = os.path.splitext(filename)
 
-    # Add timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{name}_{timestamp}{ext}"
-    print("filename:----", filename)
+    mode = mode or DOWNLOAD_MODE
+    save_path = os.path.join(file_path, make_download_name(url))
 
-    save_path = os.path.join(file_path, filename)
-    if os.path.exists(save_path):
-        print("Already downloaded this file")
-        return save_path
+    # The session retries failed connects/statuses; this loop also covers drops mid-body.
+    # Ranged downloads keep their progress, so each retry resumes instead of restarting.
+    for attempt in range(retries + 1):
+        try:
+            start = time.perf_counter()
+            size, validator = (None, None)
+            if mode == "auto":
+                size, validator = probe_ranges(url)
 
-    r = requests.get(url)
-    r.raise_for_status()
-    with open(save_path, 'wb') as f:
-        f.write(r.content)
-    print(f"saved successfully file- {save_path}")
-    return save_path
+            if size is not None and size >= DOWNLOAD_RANGE_MIN_BYTES:
+                download = RangedDownload(url, size, validator)
+                fetched = download.run(save_path)
+                how = f"{len(download.ranges)} ranges"
+                if download.resumed_bytes:
+                    how += f", resumed {download.resumed_bytes / 1024 / 1024:.1f} MB"
+            else:
+                fetched = size = stream_to_file(url, save_path)
+                how = "single stream"
 
+            elapsed = max(time.perf_counter() - start, 1e-6)
+            print(
+                f"saved successfully file- {save_path} ({size / 1024 / 1024:.1f} MB in {elapsed:.1f}s, "
+                f"{fetched / 1024 / 1024 / elapsed:.1f} MB/s, {how})"
+            )
+            return save_path
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout,
+                SourceChangedError) as e:
+            if attempt == retries:
+                raise
+            wait = 0.5 * 2 ** attempt
+            print(f"⚠️ Download interrupted ({e}), retrying in {wait:.1f}s ({attempt + 1}/{retries})")
+            time.sleep(wait)
@@ -1,9 +1,10 @@
 import yt_dlp
-import requests
 import gdown
 import subprocess
 import os
 import re
+from app.services.media_probe import probe_media, MediaProbeError
+from app.services.remote_probe import probe_remote_media
 
 SUPPORTED_EXTENSIONS = {"mp4", "3gp", "avi", "mov"}
 
@@ -79,16 +80,22 @@ def download_drive_video(url, save_dir="./downloads"):
     return local_path
 
 def get_video_duration_ffmpeg(video_path):
-    result = subprocess.run(
-        ["ffprobe", "-v", "error", "-show_entries",
-         "format=duration", "-of",
-         "default=noprint_wrappers=1:nokey=1", video_path],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
-    )
-    return float(result.stdout)
+    duration = probe_media(video_path).duration
+    if duration is None:
+        raise ValueError(f"No duration for {video_path}")
+    return duration
 
 def get_drive_duration(url, save_dir="./downloads"):
+    # Header-only probe first; Drive's confirm page for large files falls back to a download
+    try:
+        duration_seconds = probe_remote_media(
+            f"https://drive.google.com/uc?export=download&id={extract_drive_file_id(url)}"
+        ).duration
+        if duration_seconds is not None:
+            return duration_seconds
+    except MediaProbeError as e:
+        print(f"⚠️ Remote probe failed for {url} ({e}), downloading instead")
+
     local_path = download_drive_video(url, save_dir)
 
     try:
@@ -118,33 +125,13 @@ def get_extension_from_url(url: str) -> str:
     return ext
 
 def get_cloudinary_video_duration(url, temp_dir="./downloads"):
-    os.makedirs(temp_dir, exist_ok=True)
-    local_path = os.path.join(temp_dir, "temp_video.mp4")
-    
-    # Download video
-    r = requests.get(url, stream=True)
-    if r.status_code != 200:
-        raise Exception("Cannot access Cloudinary video URL")
-    with open(local_path, "wb") as f:
-        for chunk in r.iter_content(chunk_size=8192):
-            f.write(chunk)
-    
-    # Get duration using ffprobe
-    result = subprocess.run(
-        ["ffprobe", "-v", "error", "-show_entries",
-         "format=duration", "-of",
-         "default=noprint_wrappers=1:nokey=1", local_path],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
-    )
-
+    # Only the container header is read (byte ranges), not the whole video
     try:
-        duration_sec = float(result.stdout)
-    except ValueError:
+        duration_sec = probe_remote_media(url).duration
+    except MediaProbeError:
+        raise Exception("Cannot access Cloudinary video URL")
+    if duration_sec is None:
         raise Exception("Unable to determine video duration")
-    
-    # Cleanup
-    os.remove(local_path)
 
     # Validate extension
     ext = get_extension_from_url(url)
@@ -0,0 +1,502 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+from app.config import EMBEDDING_ONNX_DIR, EMBEDDING_WEIGHTS_DIR
+from app.services.download_file import lock_file, unlock_file
+
+
+class EmbeddingBackend:
+    """
+    Base class: encode() sorts texts by token length (less padding per batch),
+    delegates to _encode_sorted() and restores the input order.
+    Subclasses set tokenizer / max_seq_length in load(); those whose engine
+    already sorts by length set sorts_internally and skip the extra tokenize.
+    """
+
+    name = "base"
+    sorts_internally = False
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.tokenizer = None
+        self.max_seq_length = 512
+        self.device = "cpu"
+
+    def load(self):
+        raise NotImplementedError
+
+    def _encode_sorted(self, texts, batch_size) -> np.ndarray:
+        raise NotImplementedError
+
+    def encode(self, texts, batch_size=32) -> np.ndarray:
+        """L2-normalized float32 embeddings, one row per text, in input order"""
+        if self.sorts_internally:
+            return self._encode_sorted(texts, batch_size)
+
+        encoded = self.tokenizer(
+            texts, add_special_tokens=False, truncation=True, max_length=self.max_seq_length
+        )
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        order = np.argsort(lengths, kind="stable")[::-1]
+
+        embeddings = self._encode_sorted([texts[i] for i in order], batch_size)
+
+        result = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+        result[order] = embeddings
+        return result
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """The original fp32 PyTorch path through SentenceTransformer"""
+
+    name = "torch"
+    # SentenceTransformer.encode sorts by length and restores the order itself
+    sorts_internally = True
+
+    def load(self, device=None):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = SentenceTransformer(self.model_name, device=self.device)
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+        return self
+
+    def _encode_sorted(self, texts, batch_size):
+        return self.model.encode(
+            texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+        )
+
+
+class QuantizedTorchBackend(SentenceTransformerBackend):
+    """PyTorch int8 dynamic quantization of the Linear layers (CPU only)"""
+
+    name = "torch-int8"
+
+    def load(self, device=None):
+        import torch
+
+        super().load(device="cpu")
+        torch.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        return self
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime on CPU. The transformer is exported once to EMBEDDING_ONNX_DIR;
+    mean pooling and normalization (the model's SentenceTransformer head) run in numpy.
+    """
+
+    name = "onnx"
+    quantize = False
+
+    def _onnx_path(self):
+        safe_name = self.model_name.replace("/", "__")
+        suffix = "-int8" if self.quantize else ""
+        return os.path.join(EMBEDDING_ONNX_DIR, f"{safe_name}{suffix}.onnx")
+
+    def _export(self, onnx_path):
+        import torch
+        from transformers import AutoModel
+
+        class _HiddenStates(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+        print(f"⏳ Exporting {self.model_name} to ONNX...")
+        model = _HiddenStates(AutoModel.from_pretrained(self.model_name)).eval()
+        dummy = self.tokenizer(["export"], return_tensors="pt")
+        tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"}
+            },
+            opset_version=14
+        )
+        os.replace(tmp_path, onnx_path)
+
+    def _quantize(self, fp32_path, onnx_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, onnx_path)
+
+    def _build_once(self, path, build):
+        """Run build() unless path exists; workers starting together build once, the others wait"""
+        if os.path.exists(path):
+            return
+        lock = open(path + ".lock", "a")
+        lock_file(lock)
+        try:
+            if not os.path.exists(path):
+                build()
+        finally:
+            unlock_file(lock)
+
+    def load(self, device=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.max_seq_length = min(512, self.tokenizer.model_max_length)
+        os.makedirs(EMBEDDING_ONNX_DIR, exist_ok=True)
+
+        onnx_path = self._onnx_path()
+        if self.quantize:
+            fp32 = OnnxBackend(self.model_name)
+            fp32.tokenizer = self.tokenizer
+            fp32_path = fp32._onnx_path()
+            fp32._build_once(fp32_path, lambda: fp32._export(fp32_path))
+            self._build_once(onnx_path, lambda: self._quantize(fp32_path, onnx_path))
+        else:
+            self._build_once(onnx_path, lambda: self._export(onnx_path))
+
+        self.session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        return self
+
+    def _encode_sorted(self, texts, batch_size):
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            mask = batch["attention_mask"].astype(np.int64)
+            hidden = self.session.run(
+                ["last_hidden_state"],
+                {"input_ids": batch["input_ids"].astype(np.int64), "attention_mask": mask}
+            )[0]
+            # Mean pooling over real tokens, then L2 normalize
+            mask = mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            chunks.append(pooled.astype(np.float32))
+        return np.concatenate(chunks, axis=0)
+
+
+class QuantizedOnnxBackend(OnnxBackend):
+    """ONNX Runtime with int8 dynamically quantized weights"""
+
+    name = "onnx-int8"
+    quantize = True
+
+
+SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool"
+}
+
+
+def get_process_memory() -> dict:
+    """
+    Memory of this process in MB. rss_file is the file-backed (shareable) part,
+    pss splits shared pages between the processes mapping them.
+    """
+    memory = {}
+    fields = {"VmRSS": "rss", "RssAnon": "rss_anon", "RssFile": "rss_file"}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    memory[fields[name]] = round(int(value.split()[0]) / 1024, 1)
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    memory["pss"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        # Not Linux
+        pass
+    return memory
+
+
+class MmapTorchBackend(EmbeddingBackend):
+    """
+    fp32 PyTorch on CPU with weights memory-mapped from a local safetensors file.
+    The file is written once per host; every worker process maps it read-only
+    (copy-on-write), so they share the same physical pages from the page cache
+    and skip deserializing ~1 GB of weights at startup.
+    """
+
+    name = "torch-mmap"
+
+    def _weights_path(self):
+        safe_name = self.model_name.replace("/", "__")
+        return os.path.join(EMBEDDING_WEIGHTS_DIR, f"{safe_name}.safetensors")
+
+    def _convert(self, weights_path):
+        import torch
+        from transformers import AutoModel
+        from safetensors.torch import save_file
+
+        print(f"⏳ Converting {self.model_name} weights to {weights_path}...")
+        model = AutoModel.from_pretrained(self.model_name, torch_dtype=torch.float32)
+        # Buffers too: non-persistent ones (position_ids...) are not in state_dict()
+        tensors = dict(model.named_parameters())
+        tensors.update(model.named_buffers())
+        tensors = {name: tensor.detach().contiguous() for name, tensor in tensors.items()}
+
+        tmp_path = f"{weights_path}.{os.getpid()}.tmp"
+        save_file(tensors, tmp_path)
+        os.replace(tmp_path, weights_path)
+
+    def _ensure_weights(self):
+        os.makedirs(EMBEDDING_WEIGHTS_DIR, exist_ok=True)
+        weights_path = self._weights_path()
+        if os.path.exists(weights_path):
+            return weights_path
+
+        # Workers starting together convert once; the others wait for the file
+        lock = open(weights_path + ".lock", "a")
+        lock_file(lock)
+        try:
+            if not os.path.exists(weights_path):
+                self._convert(weights_path)
+        finally:
+            unlock_file(lock)
+        return weights_path
+
+    def _map_tensors(self, weights_path):
+        import torch
+
+        with open(weights_path, "rb") as f:
+            header_size = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_size))
+        header.pop("__metadata__", None)
+
+        # shared=False maps the file MAP_PRIVATE: read-only pages stay shared with other processes
+        nbytes = os.path.getsize(weights_path)
+        storage = torch.UntypedStorage.from_file(weights_path, shared=False, nbytes=nbytes)
+        buffer = torch.empty(0, dtype=torch.uint8).set_(storage)
+
+        data_start = 8 + header_size
+        tensors = {}
+        for name, info in header.items():
+            dtype = getattr(torch, SAFETENSORS_DTYPES[info["dtype"]])
+            start, end = info["data_offsets"]
+            raw = buffer[data_start + start:data_start + end]
+            if (data_start + start) % dtype.itemsize:
+                # Misaligned for this dtype, only this tensor is copied
+                raw = raw.clone()
+            tensors[name] = raw.view(dtype).view(info["shape"])
+        return tensors
+
+    def load(self, device=None):
+        import torch
+        from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+        weights_path = self._ensure_weights()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.max_seq_length = min(512, self.tokenizer.model_max_length)
+
+        # Build the module skeleton without allocating weights, then point it at the mapped tensors
+        config = AutoConfig.from_pretrained(self.model_name)
+        with torch.device("meta"):
+            model = AutoModel.from_config(config)
+
+        for name, tensor in self._map_tensors(weights_path).items():
+            module_name, _, leaf = name.rpartition(".")
+            module = model.get_submodule(module_name)
+            if leaf in module._parameters:
+                module._parameters[leaf] = torch.nn.Parameter(tensor, requires_grad=False)
+            else:
+                module._buffers[leaf] = tensor
+
+        missing = [name for name, tensor in model.state_dict().items() if tensor.is_meta]
+        if missing:
+            raise RuntimeError(f"Weights missing from {weights_path}: {', '.join(missing[:5])}")
+
+        self.model = model.eval()
+        self.device = "cpu"
+        return self
+
+    def _encode_sorted(self, texts, batch_size):
+        import torch
+
+        chunks = []
+        with torch.inference_mode():
+            for start in range(0, len(texts), batch_size):
+                batch = self.tokenizer(
+                    texts[start:start + batch_size], padding=True, truncation=True,
+                    max_length=self.max_seq_length, return_tensors="pt"
+                )
+                hidden = self.model(**batch)[0]
+                # Mean pooling over real tokens, then L2 normalize (the SentenceTransformer head)
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+                chunks.append(pooled.numpy().astype(np.float32))
+        return np.concatenate(chunks, axis=0)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (
+        SentenceTransformerBackend, QuantizedTorchBackend, MmapTorchBackend,
+        OnnxBackend, QuantizedOnnxBackend
+    )
+}
+
+
+def create_backend(name, model_name) -> EmbeddingBackend:
+    """Instantiate and load the named backend"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}. Supported: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_name).load()
+
+
+# --------------------
+# Parity check and benchmark:
+#   python -m app.services.embedding_backends <backend> [clips.json]
+# clips.json is a Vizard "videos" list; transcripts become the passages.
+
+SAMPLE_QUERIES = [
+    "talks about feminism and misconceptions",
+    "funny moments",
+    "advice for starting a business",
+    "habla sobre la familia",
+]
+
+SAMPLE_PASSAGES = [
+    "I was appointed six months ago. And the more I've spoken about feminism, the more I have realized that fighting for women's rights has too often become synonymous with man-hating.",
+    "When I was eight, I was confused with being called bossy because I wanted to direct the plays that we would put on for our parents.",
+    "And then the dog just walked straight into the pool, looked at us like it was our fault, and we couldn't stop laughing for ten minutes.",
+    "The first thing you need before starting a company is a real customer problem, not an idea you fell in love with in the shower.",
+    "Cash flow kills more small businesses than competition does, so watch it every single week.",
+    "Mi familia siempre se reunía los domingos para comer juntos, y esa tradición me enseñó mucho.",
+    "15 months have passed, and it feels like yesterday that we took the most important decision of our lives.",
+    "The MBA has been a dream, a dream for most of us before it even began.",
+    "He tried to parallel park for twenty minutes while the whole street filmed him. Legendary.",
+    "Interest rates affect the housing market more than most buyers realise when they sign.",
+]
+
+
+def _ranks(values):
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values)] = np.arange(len(values))
+    return ranks
+
+
+def parity_report(reference, candidate, queries, passages, threshold=0.5):
+    """Compare candidate vs reference embeddings and per-query passage rankings"""
+    ref_q, ref_p = reference.encode(queries), reference.encode(passages)
+    cand_q, cand_p = candidate.encode(queries), candidate.encode(passages)
+
+    vector_cos = np.concatenate([
+        np.sum(ref_q * cand_q, axis=1), np.sum(ref_p * cand_p, axis=1)
+    ])
+
+    spearman, top1, top3, decisions = [], 0, [], []
+    k = min(3, len(passages))
+    for n in range(len(queries)):
+        ref_scores, cand_scores = ref_p @ ref_q[n], cand_p @ cand_q[n]
+        spearman.append(np.corrcoef(_ranks(ref_scores), _ranks(cand_scores))[0, 1])
+        top1 += int(np.argmax(ref_scores) == np.argmax(cand_scores))
+        ref_top = set(np.argsort(-ref_scores)[:k])
+        cand_top = set(np.argsort(-cand_scores)[:k])
+        top3.append(len(ref_top & cand_top) / k)
+        decisions.append(np.mean((ref_scores >= threshold) == (cand_scores >= threshold)))
+
+    return {
+        "embedding_cosine_mean": float(vector_cos.mean()),
+        "embedding_cosine_min": float(vector_cos.min()),
+        "spearman_mean": float(np.mean(spearman)),
+        "top1_agreement": top1 / len(queries),
+        f"top{k}_overlap": float(np.mean(top3)),
+        "filter_decision_agreement": float(np.mean(decisions))
+    }
+
+
+def benchmark(backend, passages, total=200, batch_size=32):
+    """Clips (transcripts) encoded per second"""
+    texts = (passages * (total // len(passages) + 1))[:total]
+    backend.encode(texts[:batch_size], batch_size)  # warm up
+    start = time.perf_counter()
+    backend.encode(texts, batch_size)
+    return total / (time.perf_counter() - start)
+
+
+def _memory_probe(name, model_name, barrier, results):
+    start = time.perf_counter()
+    backend = create_backend(name, model_name)
+    backend.encode(["warmup"], batch_size=1)
+    load_seconds = time.perf_counter() - start
+    # Measure once every process holds its model
+    barrier.wait()
+    results.put({"pid": os.getpid(), "load_seconds": round(load_seconds, 2), **get_process_memory()})
+    barrier.wait()
+
+
+def memory_report(name, model_name, processes):
+    """Load the backend in N processes at once and report load time and memory per process"""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier, results = ctx.Barrier(processes), ctx.Queue()
+    workers = [
+        ctx.Process(target=_memory_probe, args=(name, model_name, barrier, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    rows = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return rows
+
+
+if __name__ == "__main__":
+    from app.services.filter_clips import MODEL_NAME
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--memory":
+        # python -m app.services.embedding_backends --memory [backend] [processes]
+        name = sys.argv[2] if len(sys.argv) > 2 else "torch-mmap"
+        processes = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+        rows = memory_report(name, MODEL_NAME, processes)
+        print(f"\n{name} x {processes} processes (MB)")
+        print(f"{'pid':>8}{'load s':>8}{'rss':>9}{'anon':>9}{'file':>9}{'pss':>9}")
+        for row in rows:
+            print(
+                f"{row['pid']:>8}{row['load_seconds']:>8}{row.get('rss', 0):>9}"
+                f"{row.get('rss_anon', 0):>9}{row.get('rss_file', 0):>9}{row.get('pss', 0):>9}"
+            )
+        print(f"Total PSS: {sum(row.get('pss', 0) for row in rows):.1f} MB")
+        sys.exit(0)
+
+    candidate_name = sys.argv[1] if len(sys.argv) > 1 else "onnx"
+    passages = SAMPLE_PASSAGES
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r", encoding="utf-8") as f:
+            passages = [clip["transcript"] for clip in json.load(f) if clip.get("transcript")]
+
+    backends = {}
+    for name in dict.fromkeys(["torch", candidate_name]):
+        start = time.perf_counter()
+        backends[name] = create_backend(name, MODEL_NAME)
+        print(f"Loaded {name} in {time.perf_counter() - start:.1f}s")
+
+    print(f"\nParity of {candidate_name} vs torch (fp32):")
+    report = parity_report(backends["torch"], backends[candidate_name], SAMPLE_QUERIES, passages)
+    for key, value in report.items():
+        print(f"  {key:<28}{value:.4f}")
+
+    print("\nThroughput:")
+    for name, backend in backends.items():
+        print(f"  {name:<12}{benchmark(backend, passages):8.1f} clips/s")
@@ -0,0 +1,205 @@
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from app.config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MEMORY_ITEMS
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys (Unicode NFC, collapsed whitespace)"""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding store with an in-memory LRU in front.
+
+    SQLite maps (model name + normalized text hash) to a row of a float32 matrix
+    kept in a memory-mapped file. Rows are allocated and the file is grown inside
+    an IMMEDIATE transaction, and a key is only inserted after its vector is
+    written, so several processes can share one cache directory.
+    """
+
+    GROW_ROWS = 4096
+
+    def __init__(self, cache_dir, memory_items):
+        self.cache_dir = cache_dir
+        self.db_path = os.path.join(cache_dir, "embeddings.sqlite3")
+        self.matrix_path = os.path.join(cache_dir, "embeddings.f32")
+        self.memory_items = memory_items
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = None
+        self._matrix = None
+        self._matrix_rows = 0
+        self.dim = None
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        os.makedirs(self.cache_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, model TEXT, row INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn = conn
+        self._load_dim()
+        return conn
+
+    def _load_dim(self):
+        """Vector width, fixed by the first put (possibly from another process)"""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+
+    def _map_matrix(self, min_rows):
+        """(Re)map the matrix file if it grew past what is currently mapped"""
+        if self._matrix is not None and self._matrix_rows >= min_rows:
+            return self._matrix
+        size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        rows = size // (self.dim * 4)
+        if rows < min_rows:
+            raise RuntimeError(f"Embedding matrix has {rows} rows, need {min_rows}")
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        self._matrix_rows = rows
+        return self._matrix
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model_name, texts):
+        """Return a list with a float32 vector (hit) or None (miss) per text"""
+        keys = [make_key(model_name, text) for text in texts]
+        results = [None] * len(texts)
+
+        with self._lock:
+            disk_lookup = {}
+            for n, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[n] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(n)
+
+            if disk_lookup:
+                conn = self._connect()
+                found = {}
+                key_list = list(disk_lookup)
+                for start in range(0, len(key_list), 500):
+                    chunk = key_list[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    for key, row in conn.execute(
+                        f"SELECT key, row FROM entries WHERE key IN ({placeholders})", chunk
+                    ):
+                        found[key] = row
+
+                if found:
+                    if self.dim is None:
+                        self._load_dim()
+                    matrix = self._map_matrix(max(found.values()) + 1)
+                    for key, row in found.items():
+                        vector = np.array(matrix[row], dtype=np.float32)
+                        self._remember(key, vector)
+                        for n in disk_lookup[key]:
+                            results[n] = vector
+
+                self.hits += len(found)
+                self.misses += len(disk_lookup) - len(found)
+
+        return results
+
+    def put_many(self, model_name, texts, vectors):
+        """Store vectors (rows of a float32 array) for texts"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) == 0:
+            return
+        keys = [make_key(model_name, text) for text in texts]
+
+        with self._lock:
+            conn = self._connect()
+            # Skip keys another call/process stored meanwhile
+            unique = {}
+            for key, vector in zip(keys, vectors):
+                unique.setdefault(key, vector)
+            placeholders = ",".join("?" * len(unique))
+            existing = {k for (k,) in conn.execute(
+                f"SELECT key FROM entries WHERE key IN ({placeholders})", list(unique)
+            )}
+            new_items = [(k, v) for k, v in unique.items() if k not in existing]
+            if not new_items:
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._load_dim()
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),))
+                elif self.dim != vectors.shape[1]:
+                    conn.execute("ROLLBACK")
+                    print(f"⚠️ Embedding dim {vectors.shape[1]} != cache dim {self.dim}, not caching")
+                    return
+
+                row = conn.execute("SELECT value FROM meta WHERE name = 'next_row'").fetchone()
+                first_row = int(row[0]) if row else 0
+                next_row = first_row + len(new_items)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('next_row', ?)", (str(next_row),)
+                )
+
+                # Grow the file while holding the write lock so processes never shrink it
+                needed = next_row * self.dim * 4
+                size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+                if size < needed:
+                    grow_to = (next_row + self.GROW_ROWS) * self.dim * 4
+                    with open(self.matrix_path, "ab") as f:
+                        f.truncate(grow_to)
+
+                matrix = self._map_matrix(next_row)
+                for offset, (key, vector) in enumerate(new_items):
+                    matrix[first_row + offset] = vector
+                matrix.flush()
+
+                conn.executemany(
+                    "INSERT OR IGNORE INTO entries (key, model, row) VALUES (?, ?, ?)",
+                    [(key, model_name, first_row + offset) for offset, (key, _) in enumerate(new_items)]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            for key, vector in new_items:
+                self._remember(key, vector)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries = None
+            if self._conn is not None:
+                entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                "entries": entries,
+                "memory_entries": len(self._memory),
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses
+            }
+
+
+# Global instance (opens its files on first use)
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MEMORY_ITEMS)
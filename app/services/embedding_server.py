@@ -0,0 +1,242 @@
+import os
+import time
+import queue
+import socket
+import secrets
+import threading
+from multiprocessing.connection import Listener, Client, deliver_challenge, answer_challenge
+import numpy as np
+from app.config import (
+    DATA_DIR, EMBEDDING_SERVER_HOST, EMBEDDING_SERVER_PORT,
+    EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_MAX_BATCH
+)
+
+
+def get_authkey() -> bytes:
+    """
+    Shared secret for the local socket (messages are pickled, so only
+    authenticated peers may connect). EMBEDDING_SERVER_AUTHKEY wins; otherwise
+    a per-host key file is created on first use.
+    """
+    env_key = os.getenv("EMBEDDING_SERVER_AUTHKEY")
+    if env_key:
+        return env_key.encode("utf-8")
+
+    key_path = os.path.join(DATA_DIR, "embedding_server.key")
+    if not os.path.exists(key_path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+        except FileExistsError:
+            pass
+    with open(key_path, "r") as f:
+        return f.read().strip().encode("utf-8")
+
+
+# A client must finish the authkey handshake within this many seconds
+HANDSHAKE_TIMEOUT = 10
+
+
+class _PendingRequest:
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings = None
+        self.error = None
+
+
+class EmbeddingServer:
+    """
+    Holds the single model copy for this host and serves encode requests from
+    API workers. Requests from concurrent jobs are collected for up to
+    batch_window seconds (or max_batch texts) and encoded together.
+    """
+
+    def __init__(self, address, authkey, batch_window, max_batch):
+        self.address = address
+        self.authkey = authkey
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "texts": 0}
+
+    def serve_forever(self):
+        from app.services.filter_clips import get_model
+        get_model()
+
+        threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True).start()
+        # No authkey on the listener: accept() would run the handshake on this thread,
+        # so one stalled client would block everyone; each handler thread does its own
+        listener = Listener(self.address, backlog=128)
+        print(f"🧠 Embedding server listening on {self.address[0]}:{self.address[1]}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"⚠️ Embedding accept failed: {e}")
+                continue
+            threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def _authenticate(self, conn):
+        """The authkey handshake Listener.accept() would do, bounded by HANDSHAKE_TIMEOUT"""
+        def abort():
+            # Shutting the socket down wakes the blocked recv in the handshake
+            try:
+                sock = socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+                sock.shutdown(socket.SHUT_RDWR)
+                sock.close()
+            except OSError:
+                pass
+
+        timer = threading.Timer(HANDSHAKE_TIMEOUT, abort)
+        timer.daemon = True
+        timer.start()
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+        finally:
+            timer.cancel()
+
+    def _handle_connection(self, conn):
+        try:
+            self._authenticate(conn)
+        except Exception as e:
+            # Wrong key, or a client that stalled mid-handshake
+            print(f"⚠️ Rejected embedding client: {e}")
+            conn.close()
+            return
+
+        try:
+            while True:
+                message = conn.recv()
+                op = message.get("op")
+                if op == "ping":
+                    conn.send({"ok": True, "stats": dict(self.stats)})
+                elif op == "encode":
+                    request = _PendingRequest(message["texts"])
+                    self.requests.put(request)
+                    request.done.wait()
+                    if request.error:
+                        conn.send({"ok": False, "error": request.error})
+                    else:
+                        conn.send({"ok": True, "embeddings": request.embeddings})
+                else:
+                    conn.send({"ok": False, "error": f"Unknown op: {op}"})
+        except EOFError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Embedding client connection error: {e}")
+        finally:
+            conn.close()
+
+    def _batch_loop(self):
+        from app.services.filter_clips import _encode_local
+
+        while True:
+            batch = [self.requests.get()]
+            text_count = len(batch[0].texts)
+            deadline = time.monotonic() + self.batch_window
+
+            # Micro-batch: gather whatever else arrives within the window
+            while text_count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                text_count += len(request.texts)
+
+            texts = [text for request in batch for text in request.texts]
+            try:
+                embeddings = _encode_local(texts)
+                offset = 0
+                for request in batch:
+                    request.embeddings = embeddings[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                for request in batch:
+                    request.error = str(e)
+            finally:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["texts"] += len(texts)
+                for request in batch:
+                    request.done.set()
+
+
+class EmbeddingClient:
+    """Thread-safe client: one socket per calling thread"""
+
+    def __init__(self, address, timeout=60):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=get_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _call(self, message):
+        for attempt in range(2):
+            conn = self._conn()
+            try:
+                conn.send(message)
+            except (EOFError, BrokenPipeError, ConnectionError):
+                # Stale socket (e.g. server restarted): the request never arrived, reconnect once
+                self.close()
+                if attempt == 1:
+                    raise
+                continue
+
+            # Sent: never resend (the server may be working on it), and never reuse
+            # the socket after a failure, or a late reply would answer the next call
+            try:
+                if not conn.poll(self.timeout):
+                    raise TimeoutError("Embedding server did not answer in time")
+                return conn.recv()
+            except BaseException:
+                self.close()
+                raise
+
+    def encode(self, texts) -> np.ndarray:
+        reply = self._call({"op": "encode", "texts": list(texts)})
+        if not reply.get("ok"):
+            raise RuntimeError(f"Embedding server error: {reply.get('error')}")
+        return np.asarray(reply["embeddings"], dtype=np.float32)
+
+    def ping(self) -> bool:
+        try:
+            return bool(self._call({"op": "ping"}).get("ok"))
+        except Exception:
+            return False
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._local.conn = None
+
+
+# Global client used by filter_clips when EMBEDDING_SERVER_ENABLED
+embedding_client = EmbeddingClient((EMBEDDING_SERVER_HOST, EMBEDDING_SERVER_PORT))
+
+
+if __name__ == "__main__":
+    server = EmbeddingServer(
+        (EMBEDDING_SERVER_HOST, EMBEDDING_SERVER_PORT),
+        get_authkey(),
+        batch_window=EMBEDDING_BATCH_WINDOW_MS / 1000,
+        max_batch=EMBEDDING_MAX_BATCH
+    )
+    server.serve_forever()
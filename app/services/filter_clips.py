@@ -1,33 +1,146 @@
-from sentence_transformers import SentenceTransformer, util
-import torch
+import os
+import time
+import threading
+import numpy as np
+from app.config import (
+    FILTER_BATCH_SIZE, EMBEDDING_CACHE_ENABLED, EMBEDDING_SERVER_ENABLED, EMBEDDING_BACKEND
+)
+from app.services.embedding_backends import create_backend, get_process_memory
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_server import embedding_client
+
+MODEL_NAME = "intfloat/multilingual-e5-base"
+# Quantized / ONNX vectors are close to but not identical with fp32, so they are cached apart
+CACHE_MODEL_KEY = (
+    MODEL_NAME if EMBEDDING_BACKEND in ("torch", "torch-mmap") else f"{MODEL_NAME}@{EMBEDDING_BACKEND}"
+)
+
+# Model (multilingual) is loaded lazily or by start_model_warmup(), never at import
+_model = None
+_model_lock = threading.Lock()
+_model_state = {"loading": False, "error": None, "load_seconds": None, "device": None}
+
+
+def get_model():
+    """Return the shared embedding backend (EMBEDDING_BACKEND), loading it on first use"""
+    global _model
+    if _model is not None:
+        return _model
+
+    with _model_lock:
+        if _model is None:
+            # Heavy imports live in the backends so app startup stays fast
+            _model_state.update(loading=True, error=None)
+            print(f"⏳ Loading embedding model {MODEL_NAME} ({EMBEDDING_BACKEND})...")
+            start = time.perf_counter()
+            try:
+                _model = create_backend(EMBEDDING_BACKEND, MODEL_NAME)
+            except Exception as e:
+                _model_state["error"] = str(e)
+                raise
+            finally:
+                _model_state["loading"] = False
+            _model_state["device"] = _model.device
+            _model_state["load_seconds"] = round(time.perf_counter() - start, 2)
+            memory = get_process_memory()
+            print(
+                f"✅ Embedding model loaded on {_model.device} in {_model_state['load_seconds']}s "
+                f"(pid {os.getpid()}, RSS {memory.get('rss')} MB, file-backed {memory.get('rss_file')} MB)"
+            )
+    return _model
+
+
+def _warmup():
+    try:
+        # One tiny encode also initializes the inference kernels
+        get_model().encode(["warmup"], batch_size=1)
+    except Exception as e:
+        print(f"❌ Embedding model warmup failed: {e}")
+
+
+def start_model_warmup():
+    """Load the model in a background thread so the first prompt request never pays the cold load"""
+    if EMBEDDING_SERVER_ENABLED:
+        # The embedding server holds the model for this host
+        return
+    if _model is not None or _model_state["loading"]:
+        return
+    _model_state["loading"] = True
+    threading.Thread(target=_warmup, name="model-warmup", daemon=True).start()
+
+
+def get_model_status() -> dict:
+    """Model readiness for the /ready endpoint"""
+    if EMBEDDING_SERVER_ENABLED:
+        return {"model": MODEL_NAME, "backend": "server", "loaded": embedding_client.ping()}
+    return {
+        "model": MODEL_NAME, "backend": "local", "engine": EMBEDDING_BACKEND,
+        "loaded": _model is not None, **_model_state,
+        "pid": os.getpid(), "memory_mb": get_process_memory()
+    }
+
+
+def _encode_local(texts, batch_size=FILTER_BATCH_SIZE):
+    """
+    Encode texts with the in-process backend (batched, sorted by token length).
+    Returns L2-normalized float32 rows in the original order.
+    """
+    return get_model().encode(texts, batch_size)
+
+
+def _encode_texts(texts, batch_size=FILTER_BATCH_SIZE):
+    """Encode via the host's embedding server when enabled, else with the in-process model"""
+    if EMBEDDING_SERVER_ENABLED:
+        try:
+            return embedding_client.encode(texts)
+        except Exception as e:
+            print(f"⚠️ Embedding server unavailable ({e}), encoding in-process")
+    return _encode_local(texts, batch_size)
+
+
+def embed_texts(texts, batch_size=FILTER_BATCH_SIZE):
+    """
+    Embeddings for texts, served from the embedding cache where possible.
+    Only cache misses reach the model; a full hit never loads it.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return _encode_texts(texts, batch_size)
+
+    cached = embedding_cache.get_many(CACHE_MODEL_KEY, texts)
+    missing = [n for n, vector in enumerate(cached) if vector is None]
+    print(f"🧠 Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+
+    if missing:
+        encoded = _encode_texts([texts[n] for n in missing], batch_size)
+        embedding_cache.put_many(CACHE_MODEL_KEY, [texts[n] for n in missing], encoded)
+        for n, vector in zip(missing, encoded):
+            cached[n] = vector
+
+    return np.stack(cached)
 
-# Load model (multilingual)
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = SentenceTransformer("intfloat/multilingual-e5-base", device=device)
 
 def filter_clips(clips, query, threshold=0.5):
-    # 2. Embed Each Transcript
-    for clip in clips:
-        clip["embedding"] = model.encode(clip["transcript"], convert_to_tensor=True)
+    if not clips:
+        return []
 
-    # 3. Query Embedding
-    query_embedding = model.encode(query, convert_to_tensor=True)
+    # 1. Embed query + all transcripts in one batch
+    transcripts = [clip.get("transcript") or "" for clip in clips]
+    embeddings = embed_texts([query] + transcripts)
+    query_embedding, transcript_embeddings = embeddings[0], embeddings[1:]
 
-    # 4. Cosine Similarity & Filter
+    # 2. Cosine similarity of normalized vectors is a single matrix-vector product
+    scores = transcript_embeddings @ query_embedding
+
+    # 3. Filter
     results = []
-    for clip in clips:
-        sim_score = util.cos_sim(query_embedding, clip["embedding"]).item()
-        if sim_score >= threshold:
-            clip["similarity"] = sim_score
+    for clip, score in zip(clips, scores):
+        if score >= threshold:
+            clip["similarity"] = float(score)
             results.append(clip)
 
-    # 5. Sort by similarity (descending)
+    # 4. Sort by similarity (descending)
     results = sorted(results, key=lambda x: x["similarity"], reverse=True)
 
-    # 6. Remove 'embedding' before returning
-    for clip in results:
-        clip.pop("embedding", None)
-
     print(results)
     return results
 
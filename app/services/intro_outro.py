@@ -1,40 +1,51 @@
 import os
 import subprocess
 from app.services.download_file import Download_File
-from app.config import DATA_DIR, MERGE_DIR
-from app.services.add_logo import AddLogo
-import cloudinary.uploader
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.config import (
+    MERGE_DIR, RENDER_MODE, RENDER_EXECUTION, RENDER_WORKERS, RENDER_QUEUE_WORKERS, CONCAT_MODE,
+    PIPELINE_DOWNLOAD_WORKERS, PIPELINE_UPLOAD_WORKERS, PIPELINE_QUEUE_SIZE
+)
+from app.services.pipeline import StagedPipeline, Stage
+from app.services.add_logo import AddLogo, convert_to_png, LOGO_POSITIONS
+from app.services.cloud_upload import cloud_uploader
 from dotenv import load_dotenv
-import cloudinary
 from app.services.duration_find import get_video_duration_ffmpeg
+from app.services.media_probe import probe_media, MediaProbeError
 
 load_dotenv(override=True)
 print("API_KEY:", os.getenv("API_KEY"))
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUD_NAME"),
-    api_key=os.getenv("API_KEY"),
-    api_secret=os.getenv("API_SECRET")
-)
-
 # Global GPU flag
 GPU_AVAILABLE = None
 
+# mp4 track timescale pinned on converted segments (ffmpeg's default for 30 fps)
+CONCAT_TIMESCALE = 15360
+
+def x264_thread_args(threads):
+    """ffmpeg args limiting libx264 to its share of the CPU"""
+    return ["-threads", str(threads)] if threads else []
+
+def get_render_pool_size(clip_count, workers=None):
+    """
+    Size the per-clip worker pool to this job's share of the machine.
+    Up to RENDER_QUEUE_WORKERS jobs render at once, so each gets CPU count / that;
+    returns (workers, x264 threads per worker) so workers x threads ~= the share.
+    """
+    cpu_budget = max(1, (os.cpu_count() or 1) // max(1, RENDER_QUEUE_WORKERS))
+    if not workers:
+        # libx264 scales well up to ~4 threads per 1080p encode
+        workers = max(1, cpu_budget // 4)
+    workers = max(1, min(workers, clip_count))
+    return workers, max(1, cpu_budget // workers)
+
 def verify_audio_stream_simple(file_path):
     """Simple audio verification"""
     try:
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
-             '-show_entries', 'stream=codec_name',
-             '-of', 'default=noprint_wrappers=1:nokey=1',
-             file_path],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0 and result.stdout.strip():
-            print(f"  🔊 Audio: {result.stdout.strip()}")
+        info = probe_media(file_path)
+        if info.has_audio:
+            print(f"  🔊 Audio: {info.audio.get('codec_name')}")
             return True
         else:
             print(f"  ⚠️ NO AUDIO!")
@@ -73,6 +84,15 @@ def check_gpu_availability():
         return False
 
 
+def get_encoder_profile():
+    """Identify the encoder settings used by convert_to_same_format (part of cache keys)"""
+    if check_gpu_availability():
+        video = "h264_nvenc:fast:5M"
+    else:
+        video = "libx264:medium:crf23"
+    return f"{video}:yuv420p:sar1:ts{CONCAT_TIMESCALE}|aac:192k:44100:2"
+
+
 def verify_video_file(file_path):
     """Verify that video file is valid and playable"""
     if not os.path.exists(file_path):
@@ -82,35 +102,33 @@ def verify_video_file(file_path):
         return False, "File too small (possibly corrupted)"
     
     try:
-        # Quick validation using ffprobe
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-show_entries', 
-             'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-             file_path],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0 and result.stdout.strip():
+        # Quick validation using the (cached) ffprobe result
+        info = probe_media(file_path)
+        if info.duration is not None:
             return True, "Valid"
         else:
-            return False, f"Invalid format: {result.stderr[:100]}"
+            return False, "Invalid format: no duration"
             
+    except MediaProbeError as e:
+        return False, f"Invalid format: {str(e)[:100]}"
     except Exception as e:
         return False, f"Validation error: {e}"
 
 
-def convert_to_same_format(input_path, output_path, target_width, target_height, target_fps=30):
+def convert_to_same_format(input_path, output_path, target_width, target_height, target_fps=30, threads=None):
     """
     Convert video to standard format with GPU/CPU fallback
+    threads: libx264 thread count (None lets x264 use every core)
+
+    Pixel format, SAR and track timescale are pinned so segments converted here
+    can be joined by merge_videos_concat without re-encoding.
     """
     # Verify input file first
     is_valid, msg = verify_video_file(input_path)
     if not is_valid:
         raise Exception(f"Invalid input video: {msg}")
     
-    vf_filter = f"scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:black"
+    vf_filter = f"scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:black,setsar=1"
     
     use_gpu = check_gpu_availability()
     
@@ -128,6 +146,8 @@ def convert_to_same_format(input_path, output_path, target_width, target_height,
             "-ar", "44100",
             "-ac", "2",
             "-b:a", "192k",
+            "-pix_fmt", "yuv420p",
+            "-video_track_timescale", str(CONCAT_TIMESCALE),
             "-movflags", "+faststart",
             output_path
         ]
@@ -138,12 +158,15 @@ def convert_to_same_format(input_path, output_path, target_width, target_height,
             "-c:v", "libx264",
             "-preset", "medium",
             "-crf", "23",
+            *x264_thread_args(threads),
             "-r", str(target_fps),
             "-vf", vf_filter,
             "-c:a", "aac",
             "-ar", "44100",
             "-ac", "2",
             "-b:a", "192k",
+            "-pix_fmt", "yuv420p",
+            "-video_track_timescale", str(CONCAT_TIMESCALE),
             "-movflags", "+faststart",
             output_path
         ]
@@ -178,12 +201,15 @@ def convert_to_same_format(input_path, output_path, target_width, target_height,
                 "-c:v", "libx264",
                 "-preset", "medium",
                 "-crf", "23",
+                *x264_thread_args(threads),
                 "-r", str(target_fps),
                 "-vf", vf_filter,
                 "-c:a", "aac",
                 "-ar", "44100",
                 "-ac", "2",
                 "-b:a", "192k",
+                "-pix_fmt", "yuv420p",
+                "-video_track_timescale", str(CONCAT_TIMESCALE),
                 "-movflags", "+faststart",
                 output_path
             ]
@@ -199,17 +225,7 @@ def add_silent_audio_if_missing(input_path, output_path):
     """
     # Check if audio exists
     try:
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
-             '-show_entries', 'stream=codec_name',
-             '-of', 'default=noprint_wrappers=1:nokey=1',
-             input_path],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        has_audio = result.returncode == 0 and result.stdout.strip()
+        has_audio = probe_media(input_path).has_audio
         
         if has_audio:
             print(f"  ✅ Audio exists, copying file...")
@@ -296,10 +312,84 @@ def prepare_intro_outro_with_audio(intro_path, outro_path, output_dir):
     
     return intro_with_audio, outro_with_audio
 
-def merge_videos_concat(list_file, output_path):
+# Stream parameters that must be identical for a concat-demuxer stream copy
+VIDEO_COPY_KEYS = ("codec_name", "profile", "level", "width", "height", "pix_fmt",
+                   "sample_aspect_ratio", "r_frame_rate", "time_base", "extradata_hash")
+AUDIO_COPY_KEYS = ("codec_name", "profile", "sample_rate", "channels", "channel_layout",
+                   "time_base", "extradata_hash")
+
+def get_stream_params(file_path):
+    """First video/audio stream parameters relevant to stream-copy concat"""
+    info = probe_media(file_path)
+    params = {}
+    if info.video:
+        params["video"] = {key: info.video.get(key) for key in VIDEO_COPY_KEYS}
+    if info.audio:
+        params["audio"] = {key: info.audio.get(key) for key in AUDIO_COPY_KEYS}
+    return params
+
+def can_stream_copy_concat(paths):
+    """
+    Check that all segments share codec, resolution, fps, timebase and audio layout.
+    Returns (True, "") or (False, reason)
+    """
+    try:
+        reference = get_stream_params(paths[0])
+        for kind in ("video", "audio"):
+            if kind not in reference:
+                return False, f"{os.path.basename(paths[0])} has no {kind} stream"
+
+        for path in paths[1:]:
+            params = get_stream_params(path)
+            for kind in ("video", "audio"):
+                if kind not in params:
+                    return False, f"{os.path.basename(path)} has no {kind} stream"
+                for key, expected in reference[kind].items():
+                    actual = params[kind].get(key)
+                    if actual != expected:
+                        return False, f"{os.path.basename(path)}: {kind} {key} {actual} != {expected}"
+        return True, ""
+
+    except Exception as e:
+        return False, f"probe failed: {e}"
+
+def merge_videos_concat_copy(list_file, output_path):
+    """Join matching segments with the concat demuxer as a pure remux (no encode)"""
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_file,
+        "-map", "0",
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=300)
+    print(f"✅ Merged videos (stream copy): {os.path.basename(output_path)}")
+
+def merge_videos_concat(list_file, output_path, threads=None, segments=None):
     """
     Simple concat merge - works when all videos have audio streams
+    threads: libx264 thread count (None lets x264 use every core)
+    segments: paths listed in list_file; when given (and CONCAT_MODE is "auto")
+              matching segments are stream-copied instead of re-encoded
     """
+    if segments and CONCAT_MODE == "auto":
+        can_copy, reason = can_stream_copy_concat(segments)
+        if can_copy:
+            try:
+                merge_videos_concat_copy(list_file, output_path)
+                return
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                # stderr is None or bytes on a timeout
+                stderr = getattr(e, "stderr", None) or ""
+                if isinstance(stderr, bytes):
+                    stderr = stderr.decode("utf-8", "replace")
+                print(f"⚠️ Stream-copy merge failed ({type(e).__name__}), re-encoding: {stderr[:200]}")
+        else:
+            print(f"ℹ️ Segments differ ({reason}), re-encoding merge")
+
     use_gpu = check_gpu_availability()
     
     if use_gpu:
@@ -326,6 +416,7 @@ def merge_videos_concat(list_file, output_path):
             "-c:v", "libx264",
             "-preset", "medium",
             "-crf", "23",
+            *x264_thread_args(threads),
             "-c:a", "aac",
             "-b:a", "192k",
             "-ar", "44100",
@@ -360,6 +451,7 @@ def merge_videos_concat(list_file, output_path):
                 "-c:v", "libx264",
                 "-preset", "medium",
                 "-crf", "23",
+                *x264_thread_args(threads),
                 "-c:a", "aac",
                 "-b:a", "192k",
                 "-ar", "44100",
@@ -373,134 +465,422 @@ def merge_videos_concat(list_file, output_path):
             raise
 
 
-def Add_intro_outro_logo(clips_info, intro_conv, outro_conv, target_width, target_height, logo_path):
-    """Process clips with intro, outro, and logo"""
-    
-    # ✨ NEW: Prepare intro/outro with silent audio if needed
-    intro_with_audio, outro_with_audio = prepare_intro_outro_with_audio(
-        intro_conv, 
-        outro_conv, 
-        MERGE_DIR
+def build_single_pass_filtergraph(segments, target_width, target_height, target_fps=30,
+                                  logo_input=None, logo_position="top-right", logo_width=150):
+    """
+    Build one filter_complex graph for intro + main + outro (+ logo)
+
+    segments: list of (input_index, has_audio, duration) in playback order
+    Returns (filter_complex, video_label, audio_label)
+    """
+    filters = []
+    concat_inputs = ""
+
+    for n, (idx, has_audio, duration) in enumerate(segments):
+        filters.append(
+            f"[{idx}:v]scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,"
+            f"pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:black,"
+            f"setsar=1,fps={target_fps},format=yuv420p,setpts=PTS-STARTPTS[v{n}]"
+        )
+        if has_audio:
+            # Pad/trim audio to the segment length so later segments stay in sync
+            filters.append(
+                f"[{idx}:a]aresample=44100,aformat=sample_fmts=fltp:channel_layouts=stereo,"
+                f"apad,atrim=duration={duration:.3f},asetpts=PTS-STARTPTS[a{n}]"
+            )
+        else:
+            # Silent-audio fill for segments without an audio track
+            filters.append(
+                f"anullsrc=channel_layout=stereo:sample_rate=44100,"
+                f"atrim=duration={duration:.3f},asetpts=PTS-STARTPTS[a{n}]"
+            )
+        concat_inputs += f"[v{n}][a{n}]"
+
+    filters.append(f"{concat_inputs}concat=n={len(segments)}:v=1:a=1[cv][ca]")
+    video_label = "[cv]"
+
+    if logo_input is not None:
+        overlay_pos = LOGO_POSITIONS.get(logo_position, LOGO_POSITIONS["top-right"])
+        filters.append(f"[{logo_input}:v]scale={logo_width}:-1[logo]")
+        filters.append(f"[cv][logo]{overlay_pos}[outv]")
+        video_label = "[outv]"
+
+    return ";".join(filters), video_label, "[ca]"
+
+
+def render_clip_single_pass(main_path, output_path, target_width, target_height,
+                            intro_path=None, outro_path=None, logo_path=None,
+                            target_fps=30, logo_position="top-right", logo_width=150, threads=None):
+    """
+    Render intro + main + outro + logo with a single ffmpeg filtergraph,
+    so each output clip is encoded exactly once
+    Returns the output duration (sum of the segment durations)
+    """
+    segment_paths = [p for p in (intro_path, main_path, outro_path) if p]
+
+    cmd_inputs = []
+    segments = []
+    for idx, path in enumerate(segment_paths):
+        is_valid, msg = verify_video_file(path)
+        if not is_valid:
+            raise Exception(f"Invalid input video {os.path.basename(path)}: {msg}")
+        info = probe_media(path)
+        segments.append((idx, info.has_audio, info.duration))
+        cmd_inputs += ["-i", path]
+
+    # Ensure logo is PNG RGBA
+    png_logo = None
+    logo_input = None
+    if logo_path:
+        if os.path.splitext(logo_path)[1].lower() != ".png":
+            png_logo = os.path.splitext(output_path)[0] + "_logo.png"
+            convert_to_png(logo_path, png_logo)
+            logo_path = png_logo
+        logo_input = len(segment_paths)
+        cmd_inputs += ["-i", logo_path]
+
+    filter_complex, video_label, audio_label = build_single_pass_filtergraph(
+        segments, target_width, target_height, target_fps,
+        logo_input=logo_input, logo_position=logo_position, logo_width=logo_width
     )
-    
-    i = 1
-    successful_clips = 0
-    
-    for clip in clips_info:
-        print(f"\n{'='*70}")
-        print(f"Processing clip {i}/{len(clips_info)}")
-        print('='*70)
-        
-        main_path = main_conv = list_file = final_output = output_with_logo = None
-        
-        try:
-            # 1️⃣ Download main clip
-            print(f"📥 Downloading clip {i}...")
-            main_path = Download_File(clip['videoUrl'], DATA_DIR)
-            
-            is_valid, msg = verify_video_file(main_path)
-            if not is_valid:
-                raise Exception(f"Downloaded file invalid: {msg}")
-            
-            print(f"✅ Downloaded: {os.path.basename(main_path)}")
-            print("🔍 Checking downloaded file audio...")
-            verify_audio_stream_simple(main_path)
-
-            # 2️⃣ Convert main video
-            main_conv = os.path.join(MERGE_DIR, f"main_conv_{i}.mp4")
-            print("🔄 Converting main video...")
-            convert_to_same_format(main_path, main_conv, target_width, target_height)
-            
-            print("🔍 Checking converted file audio...")
-            verify_audio_stream_simple(main_conv)
-
-            # 3️⃣ Prepare concat list (using videos with audio)
-            list_file = os.path.join(MERGE_DIR, f"videos_{i}.txt")
-            with open(list_file, "w", encoding="utf-8") as f:
-                f.write(f"file '{os.path.abspath(intro_with_audio)}'\n")
-                f.write(f"file '{os.path.abspath(main_conv)}'\n")
-                f.write(f"file '{os.path.abspath(outro_with_audio)}'\n")
-            print(f"📝 Created concat list")
-
-            # 4️⃣ Merge videos
-            final_output = os.path.join(MERGE_DIR, f"final_video_clip_{i}.mp4")
-            print("🎬 Merging intro + main + outro...")
-            merge_videos_concat(list_file, final_output)
-            
-            print("🔍 Checking merged file audio...")
-            verify_audio_stream_simple(final_output)
 
-            # 5️⃣ Add logo
-            output_with_logo = os.path.join(MERGE_DIR, f"final_clip_with_logo_{i}.mp4")
-            print("🎨 Adding logo overlay...")
-            AddLogo(final_output, logo_path, output_path=output_with_logo)
-            
-            print("🔍 Checking final file audio...")
-            if not verify_audio_stream_simple(output_with_logo):
-                print("❌❌❌ FINAL VIDEO HAS NO AUDIO! ❌❌❌")
-            
-            is_valid, msg = verify_video_file(output_with_logo)
-            if not is_valid:
-                raise Exception(f"Final video validation failed: {msg}")
+    def build_cmd(gpu):
+        if gpu:
+            video_args = ["-c:v", "h264_nvenc", "-preset", "fast", "-b:v", "5M"]
+        else:
+            video_args = ["-c:v", "libx264", "-preset", "medium", "-crf", "23", *x264_thread_args(threads)]
+        return [
+            "ffmpeg", "-y",
+            *cmd_inputs,
+            "-filter_complex", filter_complex,
+            "-map", video_label,
+            "-map", audio_label,
+            *video_args,
+            "-r", str(target_fps),
+            "-c:a", "aac",
+            "-b:a", "192k",
+            "-ar", "44100",
+            "-ac", "2",
+            "-movflags", "+faststart",
+            output_path
+        ]
+
+    use_gpu = check_gpu_availability()
+
+    try:
+        subprocess.run(build_cmd(use_gpu), check=True, capture_output=True, text=True, timeout=600)
+        encoder = "GPU (NVENC)" if use_gpu else "CPU (libx264)"
+        print(f"✅ Single-pass render ({encoder}): {os.path.basename(output_path)}")
+
+    except subprocess.CalledProcessError as e:
+        if use_gpu and ("cuda" in e.stderr.lower() or "nvenc" in e.stderr.lower()):
+            print(f"⚠️ GPU single-pass render failed, retrying with CPU...")
 
-            # 6️⃣ Get duration
+            global GPU_AVAILABLE
+            GPU_AVAILABLE = False
+
+            subprocess.run(build_cmd(False), check=True, capture_output=True, text=True, timeout=600)
+            print(f"✅ Single-pass render (CPU fallback): {os.path.basename(output_path)}")
+        else:
+            print(f"❌ Single-pass render error: {e.stderr}")
+            raise
+
+    finally:
+        if png_logo and os.path.exists(png_logo):
             try:
-                duration = get_video_duration_ffmpeg(output_with_logo)
-                clip['duration'] = duration
-                print(f"⏱️ Duration: {duration}s")
+                os.remove(png_logo)
             except Exception as e:
-                print(f"⚠️ Could not get duration: {e}, using default")
-                clip['duration'] = 0
+                print(f"⚠️ Failed to remove temp logo: {e}")
+
+    return sum(duration for _, _, duration in segments)
+
+
+def new_clip_job(clip, i, total):
+    """Per-clip state passed between the download, render and upload stages"""
+    return {"clip": clip, "i": i, "total": total, "files": [], "output": None, "render_seconds": None}
+
+
+def download_clip(job, work_dir=MERGE_DIR):
+    """Stage 1: download and validate the main clip"""
+    i = job["i"]
+    print(f"📥 Downloading clip {i}/{job['total']}...")
+    main_path = Download_File(job["clip"]['videoUrl'], work_dir)
+    job["files"].append(main_path)
+    job["main_path"] = main_path
+
+    is_valid, msg = verify_video_file(main_path)
+    if not is_valid:
+        raise Exception(f"Downloaded file invalid: {msg}")
+
+    print(f"✅ Downloaded: {os.path.basename(main_path)}")
+    print("🔍 Checking downloaded file audio...")
+    verify_audio_stream_simple(main_path)
+    return job
+
+
+def render_clip(job, intro_with_audio, outro_with_audio, target_width, target_height,
+                logo_path, render_mode, threads=None, work_dir=MERGE_DIR):
+    """Stage 2: intro + main + outro + logo into job['output'], sets clip['duration']"""
+    i = job["i"]
+    clip = job["clip"]
+    main_path = job["main_path"]
+    single_pass = render_mode == "single_pass"
+    expected_duration = None
+
+    output_with_logo = os.path.join(work_dir, f"final_clip_with_logo_{i}.mp4")
+    job["files"].append(output_with_logo)
+    render_start = time.perf_counter()
+
+    if single_pass:
+        # 2️⃣-5️⃣ Scale, concat, silent-audio fill and logo in one encode
+        print("🎬 Rendering intro + main + outro + logo (single pass)...")
+        expected_duration = render_clip_single_pass(
+            main_path, output_with_logo, target_width, target_height,
+            intro_path=intro_with_audio, outro_path=outro_with_audio, logo_path=logo_path,
+            threads=threads
+        )
+    else:
+        # 2️⃣ Convert main video
+        main_conv = os.path.join(work_dir, f"main_conv_{i}.mp4")
+        job["files"].append(main_conv)
+        print("🔄 Converting main video...")
+        convert_to_same_format(main_path, main_conv, target_width, target_height, threads=threads)
+        
+        print("🔍 Checking converted file audio...")
+        verify_audio_stream_simple(main_conv)
+
+        # 3️⃣ Prepare concat list (using videos with audio)
+        list_file = os.path.join(work_dir, f"videos_{i}.txt")
+        job["files"].append(list_file)
+        with open(list_file, "w", encoding="utf-8") as f:
+            f.write(f"file '{os.path.abspath(intro_with_audio)}'\n")
+            f.write(f"file '{os.path.abspath(main_conv)}'\n")
+            f.write(f"file '{os.path.abspath(outro_with_audio)}'\n")
+        print(f"📝 Created concat list")
+
+        # 4️⃣ Merge videos
+        final_output = os.path.join(work_dir, f"final_video_clip_{i}.mp4")
+        job["files"].append(final_output)
+        print("🎬 Merging intro + main + outro...")
+        merge_videos_concat(
+            list_file, final_output, threads=threads,
+            segments=[intro_with_audio, main_conv, outro_with_audio]
+        )
+        
+        print("🔍 Checking merged file audio...")
+        verify_audio_stream_simple(final_output)
+
+        # Output length is known from the (already probed) segments
+        expected_duration = sum(
+            probe_media(p).duration or 0 for p in (intro_with_audio, main_conv, outro_with_audio)
+        )
+
+        # 5️⃣ Add logo
+        print("🎨 Adding logo overlay...")
+        AddLogo(final_output, logo_path, output_path=output_with_logo, threads=threads)
+
+    job["render_seconds"] = time.perf_counter() - render_start
+    print(f"⏱️ Rendered clip {i} in {job['render_seconds']:.1f}s ({render_mode})")
+    
+    print("🔍 Checking final file audio...")
+    if not verify_audio_stream_simple(output_with_logo):
+        print("❌❌❌ FINAL VIDEO HAS NO AUDIO! ❌❌❌")
+    
+    is_valid, msg = verify_video_file(output_with_logo)
+    if not is_valid:
+        raise Exception(f"Final video validation failed: {msg}")
+
+    # 6️⃣ Get duration (from segment durations, probing the output only as a fallback)
+    try:
+        duration = expected_duration or get_video_duration_ffmpeg(output_with_logo)
+        clip['duration'] = duration
+        print(f"⏱️ Duration: {duration}s")
+    except Exception as e:
+        print(f"⚠️ Could not get duration: {e}, using default")
+        clip['duration'] = 0
+
+    job["output"] = output_with_logo
+    return job
+
+
+def upload_clip(job):
+    """Stage 3: upload job['output'] to Cloudinary and set clip['videoUrl']"""
+    print("☁️ Uploading to Cloudinary...")
+    # Chunked, retried per chunk, on the uploader's shared bounded pool
+    response = cloud_uploader.upload(job["output"], folder="reels")
+    cloud_url = response['secure_url']
+    print(f"✅ Uploaded: {cloud_url[:50]}...")
+    job["clip"]['videoUrl'] = cloud_url
+    return job
 
-            # 7️⃣ Upload to Cloudinary
+
+def cleanup_clip_files(job):
+    """Delete a clip's temp files (intro/outro with audio are kept for the next clips)"""
+    print("🧹 Cleaning up...")
+    for file in job["files"]:
+        if file and os.path.exists(file):
             try:
-                print("☁️ Uploading to Cloudinary...")
-                response = cloudinary.uploader.upload(
-                    output_with_logo,
-                    resource_type="video",
-                    folder="reels",
-                    timeout=300
-                )
-                cloud_url = response['secure_url']
-                print(f"✅ Uploaded: {cloud_url[:50]}...")
-                clip['videoUrl'] = cloud_url
-                successful_clips += 1
-                
+                os.remove(file)
+                print(f"  🗑️ Deleted: {os.path.basename(file)}")
             except Exception as e:
-                print(f"❌ Cloudinary upload failed: {e}")
-                clip['videoUrl'] = None
+                print(f"  ⚠️ Delete failed: {e}")
+    job["files"] = []
+
+
+def process_clip(clip, i, total, intro_with_audio, outro_with_audio, target_width, target_height,
+                 logo_path, render_mode, threads=None, work_dir=MERGE_DIR):
+    """
+    Download, render and upload one clip, updating clip['videoUrl'] / clip['duration'].
+    Never raises: a failed clip gets videoUrl=None so other clips are unaffected.
+    Returns (success, render_seconds)
+    """
+    print(f"\n{'='*70}")
+    print(f"Processing clip {i}/{total}")
+    print('='*70)
+
+    job = new_clip_job(clip, i, total)
+    success = False
 
+    try:
+        download_clip(job, work_dir)
+        render_clip(
+            job, intro_with_audio, outro_with_audio, target_width, target_height,
+            logo_path, render_mode, threads, work_dir
+        )
+        try:
+            upload_clip(job)
+            success = True
         except Exception as e:
-            print(f"❌ Error processing clip {i}: {e}")
-            import traceback
-            traceback.print_exc()
+            print(f"❌ Cloudinary upload failed: {e}")
             clip['videoUrl'] = None
 
-        finally:
-            # Cleanup (keep intro_with_audio and outro_with_audio for next clips)
-            print("🧹 Cleaning up...")
-            for file in [main_path, main_conv, final_output, output_with_logo, list_file]:
-                if file and os.path.exists(file):
-                    try:
-                        os.remove(file)
-                        print(f"  🗑️ Deleted: {os.path.basename(file)}")
-                    except Exception as e:
-                        print(f"  ⚠️ Delete failed: {e}")
-
-        i += 1
+    except Exception as e:
+        print(f"❌ Error processing clip {i}: {e}")
+        import traceback
+        traceback.print_exc()
+        clip['videoUrl'] = None
+
+    finally:
+        cleanup_clip_files(job)
+
+    return success, job["render_seconds"]
+
+
+def process_clips_pipelined(clips_info, intro_with_audio, outro_with_audio, target_width, target_height,
+                            logo_path, render_mode, work_dir=MERGE_DIR):
+    """
+    Overlap stages across clips: clip i+1 downloads while clip i renders and clip i-1 uploads.
+    Returns [(success, render_seconds)] in clip order.
+    """
+    total = len(clips_info)
+    render_workers, threads = get_render_pool_size(total, RENDER_WORKERS)
+    print(f"🧵 Pipelining {total} clips: {PIPELINE_DOWNLOAD_WORKERS} download, "
+          f"{render_workers} render (x{threads} x264 threads), {PIPELINE_UPLOAD_WORKERS} upload workers")
+
+    def finalize(job, result):
+        if not result.ok:
+            print(f"❌ Clip {job['i']} failed in {result.failed_stage}: {result.error}")
+            job["clip"]['videoUrl'] = None
+        cleanup_clip_files(job)
+
+    pipeline = StagedPipeline([
+        Stage("download", lambda job: download_clip(job, work_dir), workers=PIPELINE_DOWNLOAD_WORKERS),
+        Stage("render", lambda job: render_clip(
+            job, intro_with_audio, outro_with_audio, target_width, target_height,
+            logo_path, render_mode, threads, work_dir
+        ), workers=render_workers),
+        Stage("upload", upload_clip, workers=PIPELINE_UPLOAD_WORKERS),
+    ], queue_size=PIPELINE_QUEUE_SIZE, finalize=finalize)
+
+    jobs = [new_clip_job(clip, i, total) for i, clip in enumerate(clips_info, start=1)]
+    results = pipeline.run(jobs)
+    print(f"📊 Pipeline: {pipeline.get_stats()}")
+    return [(result.ok, job["render_seconds"]) for result, job in zip(results, jobs)]
+
+
+def Add_intro_outro_logo(clips_info, intro_conv, outro_conv, target_width, target_height, logo_path,
+                         render_mode=None, intro_outro_ready=False, execution=None, work_dir=None):
+    """
+    Process clips with intro, outro, and logo
+
+    render_mode: "multi_step" (convert, concat, logo - three encodes) or
+                 "single_pass" (one filtergraph, one encode). Defaults to RENDER_MODE.
+    intro_outro_ready: intro/outro are already normalized with audio (e.g. from the
+                       asset cache) - use them as-is and leave them on disk.
+    execution: "sequential", "parallel" (bounded worker pool) or "pipelined" (download,
+               render and upload overlap across clips). Defaults to RENDER_EXECUTION.
+    work_dir: directory for this job's temp files, so concurrent jobs never share names.
+    """
+    work_dir = work_dir or MERGE_DIR
+    render_mode = render_mode or RENDER_MODE
+    single_pass = render_mode == "single_pass"
+    owns_intro_outro = not (single_pass or intro_outro_ready)
+    print(f"🎞️ Render mode: {render_mode}")
+
+    if not owns_intro_outro:
+        # The filtergraph scales and fills silent audio itself, or the caller prepared them
+        intro_with_audio, outro_with_audio = intro_conv, outro_conv
+    else:
+        # ✨ NEW: Prepare intro/outro with silent audio if needed
+        intro_with_audio, outro_with_audio = prepare_intro_outro_with_audio(
+            intro_conv, 
+            outro_conv, 
+            work_dir
+        )
     
-    # Final cleanup - delete intro/outro with audio
-    print("\n🧹 Final cleanup...")
-    for file in [intro_with_audio, outro_with_audio]:
-        if os.path.exists(file):
-            try:
-                os.remove(file)
-                print(f"  🗑️ Deleted: {os.path.basename(file)}")
-            except:
-                pass
+    execution = execution or RENDER_EXECUTION
+    total = len(clips_info)
+    results = [(False, None)] * total
+
+    if execution == "pipelined" and total > 1:
+        results = process_clips_pipelined(
+            clips_info, intro_with_audio, outro_with_audio,
+            target_width, target_height, logo_path, render_mode, work_dir
+        )
+    elif execution == "parallel" and total > 1:
+        workers, threads = get_render_pool_size(total, RENDER_WORKERS)
+        print(f"🧵 Rendering {total} clips with {workers} workers x {threads} x264 threads")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render") as executor:
+            futures = [
+                executor.submit(
+                    process_clip, clip, i, total, intro_with_audio, outro_with_audio,
+                    target_width, target_height, logo_path, render_mode, threads, work_dir
+                )
+                for i, clip in enumerate(clips_info, start=1)
+            ]
+            # Collect in submission order so results match the input clip order
+            for n, future in enumerate(futures):
+                try:
+                    results[n] = future.result()
+                except Exception as e:
+                    print(f"❌ Worker error for clip {n + 1}: {e}")
+                    clips_info[n]['videoUrl'] = None
+    else:
+        for i, clip in enumerate(clips_info, start=1):
+            results[i - 1] = process_clip(
+                clip, i, total, intro_with_audio, outro_with_audio,
+                target_width, target_height, logo_path, render_mode, work_dir=work_dir
+            )
+
+    successful_clips = sum(1 for success, _ in results if success)
+    render_times = [seconds for _, seconds in results if seconds is not None]
+    
+    # Final cleanup - delete intro/outro with audio (unless they belong to the caller)
+    if owns_intro_outro:
+        print("\n🧹 Final cleanup...")
+        for file in [intro_with_audio, outro_with_audio]:
+            if os.path.exists(file):
+                try:
+                    os.remove(file)
+                    print(f"  🗑️ Deleted: {os.path.basename(file)}")
+                except:
+                    pass
     
     print(f"\n{'='*70}")
     print(f"✅ Processing complete: {successful_clips}/{len(clips_info)} clips successful")
+    if render_times:
+        print(f"⏱️ Render time ({render_mode}): {sum(render_times) / len(render_times):.1f}s per clip, "
+              f"{sum(render_times):.1f}s total")
     print('='*70)
     
     return clips_info
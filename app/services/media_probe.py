@@ -0,0 +1,110 @@
+import os
+import json
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Memoized probe results, keyed by (path, mtime, size)
+_PROBE_CACHE_SIZE = 512
+_probe_cache = OrderedDict()
+_probe_lock = threading.Lock()
+_probe_stats = {"hits": 0, "misses": 0}
+
+
+class MediaProbeError(Exception):
+    """ffprobe could not read the file"""
+
+
+@dataclass
+class MediaInfo:
+    """Structured result of a single ffprobe -show_format -show_streams call"""
+    path: str
+    format_name: Optional[str]
+    duration: Optional[float]
+    size: int
+    streams: list = field(default_factory=list)
+
+    @property
+    def video(self) -> Optional[dict]:
+        """First video stream, if any"""
+        return next((s for s in self.streams if s.get("codec_type") == "video"), None)
+
+    @property
+    def audio(self) -> Optional[dict]:
+        """First audio stream, if any"""
+        return next((s for s in self.streams if s.get("codec_type") == "audio"), None)
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def has_video(self) -> bool:
+        return self.video is not None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_media(path) -> MediaInfo:
+    """
+    Probe a media file once and memoize the result by path + mtime + size,
+    so repeated checks on an unchanged file never spawn another ffprobe
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    with _probe_lock:
+        if key in _probe_cache:
+            _probe_cache.move_to_end(key)
+            _probe_stats["hits"] += 1
+            return _probe_cache[key]
+        _probe_stats["misses"] += 1
+
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_format', '-show_streams',
+             '-show_data_hash', 'sha256', '-of', 'json', path],
+            capture_output=True,
+            text=True,
+            timeout=15
+        )
+    except subprocess.TimeoutExpired:
+        raise MediaProbeError(f"ffprobe timed out: {os.path.basename(path)}")
+
+    if result.returncode != 0:
+        raise MediaProbeError(result.stderr.strip()[:200] or "ffprobe failed")
+
+    try:
+        data = json.loads(result.stdout or "{}")
+    except json.JSONDecodeError as e:
+        raise MediaProbeError(f"Invalid ffprobe output: {e}")
+
+    fmt = data.get("format", {})
+    info = MediaInfo(
+        path=path,
+        format_name=fmt.get("format_name"),
+        duration=_to_float(fmt.get("duration")),
+        size=st.st_size,
+        streams=data.get("streams", [])
+    )
+
+    with _probe_lock:
+        _probe_cache[key] = info
+        _probe_cache.move_to_end(key)
+        while len(_probe_cache) > _PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+
+    return info
+
+
+def get_probe_stats() -> dict:
+    """Probe cache hit/miss counters"""
+    with _probe_lock:
+        return {**_probe_stats, "entries": len(_probe_cache)}
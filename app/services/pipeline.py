@@ -0,0 +1,169 @@
+import time
+import queue
+import threading
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+# Marks the end of input for one stage worker
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One step of a StagedPipeline: func(item) -> item for the next stage"""
+    name: str
+    func: Callable
+    workers: int = 1
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of one input item, returned in input order"""
+    index: int
+    ok: bool
+    value: Any = None
+    error: Optional[BaseException] = None
+    failed_stage: Optional[str] = None
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    failures: int = 0
+    busy_seconds: float = 0.0
+
+
+class StagedPipeline:
+    """
+    Run items through stages (e.g. download -> render -> upload) on per-stage
+    thread pools connected by bounded queues, so item i+1 can be in an earlier
+    stage while item i is in a later one.
+
+    queue_size bounds how far a stage can run ahead of the next one (e.g. how
+    many downloaded clips may wait for a render slot). An item that raises in
+    a stage skips the remaining stages; other items are unaffected.
+    finalize(item, result) is called once per item as it leaves the pipeline.
+    """
+
+    def __init__(self, stages, queue_size=2, finalize=None):
+        if not stages:
+            raise ValueError("StagedPipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.finalize = finalize
+        self.stats = {stage.name: StageStats() for stage in stages}
+        self._stats_lock = threading.Lock()
+        self.wall_seconds = None
+
+    def _finish(self, results, index, item, result):
+        results[index] = result
+        if self.finalize:
+            try:
+                self.finalize(item, result)
+            except Exception as e:
+                print(f"⚠️ Pipeline finalize failed for item {index}: {e}")
+
+    def _worker(self, n, inbox, outbox, results, remaining):
+        stage = self.stages[n]
+        stats = self.stats[stage.name]
+        last_stage = n == len(self.stages) - 1
+
+        while True:
+            entry = inbox.get()
+            if entry is _DONE:
+                break
+            index, item = entry
+            start = time.perf_counter()
+            try:
+                value = stage.func(item)
+            except Exception as e:
+                print(f"❌ Stage '{stage.name}' failed for item {index}: {e}")
+                traceback.print_exc()
+                with self._stats_lock:
+                    stats.items += 1
+                    stats.failures += 1
+                    stats.busy_seconds += time.perf_counter() - start
+                self._finish(results, index, item, PipelineResult(index, False, item, e, stage.name))
+                continue
+
+            with self._stats_lock:
+                stats.items += 1
+                stats.busy_seconds += time.perf_counter() - start
+
+            if last_stage:
+                self._finish(results, index, value, PipelineResult(index, True, value))
+            else:
+                # Blocks while the next stage is saturated (backpressure)
+                outbox.put((index, value))
+
+        # The last worker of a stage closes the next stage's input
+        with self._stats_lock:
+            remaining[n] -= 1
+            stage_done = remaining[n] == 0
+        if stage_done and not last_stage:
+            for _ in range(self.stages[n + 1].workers):
+                outbox.put(_DONE)
+
+    def run(self, items):
+        """Process items through every stage; returns PipelineResults in input order"""
+        items = list(items)
+        results = [None] * len(items)
+        inboxes = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+
+        threads = []
+        for n, stage in enumerate(self.stages):
+            outbox = inboxes[n + 1] if n + 1 < len(self.stages) else None
+            for w in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(n, inboxes[n], outbox, results, remaining),
+                    name=f"pipeline-{stage.name}-{w}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        start = time.perf_counter()
+        for index, item in enumerate(items):
+            inboxes[0].put((index, item))
+        for _ in range(self.stages[0].workers):
+            inboxes[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        self.wall_seconds = time.perf_counter() - start
+        return results
+
+    def get_stats(self) -> dict:
+        """Per-stage item counts and busy time, plus overlap (busy time / wall time)"""
+        busy = sum(s.busy_seconds for s in self.stats.values())
+        wall = self.wall_seconds
+        return {
+            "wall_seconds": round(wall, 2) if wall else None,
+            "overlap": round(busy / wall, 2) if wall else None,
+            "stages": {
+                name: {"items": s.items, "failures": s.failures, "busy_seconds": round(s.busy_seconds, 2)}
+                for name, s in self.stats.items()
+            }
+        }
+
+
+if __name__ == "__main__":
+    # Demo: I/O-like stages overlap, so wall time approaches the slowest stage's total
+    def step(name, seconds):
+        def run(item):
+            time.sleep(seconds)
+            if name == "render" and item == 3:
+                raise RuntimeError("simulated render failure")
+            return item
+        return run
+
+    pipeline = StagedPipeline([
+        Stage("download", step("download", 0.2), workers=2),
+        Stage("render", step("render", 0.4), workers=2),
+        Stage("upload", step("upload", 0.2), workers=2),
+    ], queue_size=2)
+    results = pipeline.run(range(8))
+    print([(r.index, r.ok, r.failed_stage) for r in results])
+    print(f"Sequential would take {8 * 0.8:.1f}s")
+    print(pipeline.get_stats())
@@ -0,0 +1,292 @@
+import sys
+import json
+import time
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+from app.config import (
+    REMOTE_PROBE_HEAD_BYTES, REMOTE_PROBE_MAX_HEADER_BYTES, REMOTE_PROBE_CACHE_TTL,
+    REMOTE_PROBE_TIMEOUT, DOWNLOAD_CONNECT_TIMEOUT
+)
+from app.services.media_probe import MediaInfo, MediaProbeError
+from app.services.download_file import http_session
+
+# ffprobe's name for the ISO base media family, so MediaInfo looks the same either way
+MP4_FORMAT_NAME = "mov,mp4,m4a,3gp,3g2,mj2"
+
+# Sample entry fourcc -> ffprobe codec_name
+CODEC_NAMES = {
+    "avc1": "h264", "avc3": "h264", "hvc1": "hevc", "hev1": "hevc", "av01": "av1",
+    "vp08": "vp8", "vp09": "vp9", "mp4v": "mpeg4", "s263": "h263", "jpeg": "mjpeg",
+    "apcn": "prores", "apch": "prores", "apcs": "prores", "apco": "prores", "ap4h": "prores",
+    "mp4a": "aac", "ac-3": "ac3", "ec-3": "eac3", "Opus": "opus", "fLaC": "flac",
+    "samr": "amr_nb", "sawb": "amr_wb", "alac": "alac", "lpcm": "pcm", "sowt": "pcm_s16le", "twos": "pcm_s16be"
+}
+HANDLER_TYPES = {"vide": "video", "soun": "audio"}
+# Boxes whose children are boxes, on the way to mvhd / mdhd / hdlr / stsd
+CONTAINER_BOXES = {b"trak", b"mdia", b"minf", b"stbl"}
+
+_CACHE_SIZE = 1024
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "header_probes": 0, "ffprobe_fallbacks": 0, "bytes_read": 0}
+
+
+class RemoteProbeError(MediaProbeError):
+    """The remote file could not be probed"""
+
+
+class NotMp4Error(RemoteProbeError):
+    """No ISO base media header where one was expected; ffprobe handles other containers"""
+
+
+def _fetch_range(url, start, length):
+    """Bytes [start, start + length) of url (fewer at end of file) and the total size"""
+    headers = {"Range": f"bytes={start}-{start + length - 1}", "Accept-Encoding": "identity"}
+    with http_session.get(url, headers=headers, stream=True,
+                          timeout=(DOWNLOAD_CONNECT_TIMEOUT, REMOTE_PROBE_TIMEOUT)) as r:
+        if r.status_code == 416:
+            raise RemoteProbeError(f"Range {start}+{length} past end of {url}")
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            total = r.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+            total = int(total) if total.isdigit() else None
+        elif start == 0:
+            # No range support: read just the head of the full response, then hang up
+            total = int(r.headers["Content-Length"]) if r.headers.get("Content-Length", "").isdigit() else None
+        else:
+            raise RemoteProbeError("Server ignores byte ranges")
+
+        data = bytearray()
+        for chunk in r.iter_content(chunk_size=64 * 1024):
+            data += chunk
+            if len(data) >= length:
+                break
+
+    with _cache_lock:
+        _stats["bytes_read"] += len(data)
+    return bytes(data[:length]), total
+
+
+def _boxes(data, start=0, end=None):
+    """Yield (type, payload start, box end) for the boxes in data[start:end]"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _read_timing(data, p):
+    """(timescale, duration) of an mvhd / mdhd payload"""
+    version = data[p]
+    if version == 1:
+        return struct.unpack_from(">IQ", data, p + 20)
+    return struct.unpack_from(">II", data, p + 12)
+
+
+def _parse_track(data, start, end):
+    track = {}
+    pending = [(start, end)]
+    while pending:
+        s, e = pending.pop()
+        for box_type, p, box_end in _boxes(data, s, e):
+            if box_type in CONTAINER_BOXES:
+                pending.append((p, box_end))
+            elif box_type == b"mdhd":
+                timescale, duration = _read_timing(data, p)
+                if timescale:
+                    track["duration"] = duration / timescale
+            elif box_type == b"hdlr":
+                track["handler"] = data[p + 8:p + 12].decode("latin-1")
+            elif box_type == b"stsd" and struct.unpack_from(">I", data, p + 4)[0]:
+                entry = p + 8
+                track["fourcc"] = data[entry + 4:entry + 8].decode("latin-1")
+                track["entry"] = entry
+    return track
+
+
+def parse_moov(data, start=0, end=None):
+    """Duration and ffprobe-like stream dicts from a moov box payload"""
+    duration = None
+    streams = []
+    for box_type, p, box_end in _boxes(data, start, end):
+        if box_type == b"mvhd":
+            timescale, movie_duration = _read_timing(data, p)
+            if timescale:
+                duration = movie_duration / timescale
+        elif box_type == b"trak":
+            track = _parse_track(data, p, box_end)
+            codec_type = HANDLER_TYPES.get(track.get("handler"))
+            if codec_type is None:
+                continue
+            fourcc = track.get("fourcc", "")
+            stream = {
+                "index": len(streams),
+                "codec_type": codec_type,
+                "codec_name": CODEC_NAMES.get(fourcc, fourcc.strip() or None),
+                "codec_tag_string": fourcc,
+                "duration": track.get("duration")
+            }
+            entry = track.get("entry")
+            if entry is not None and codec_type == "video":
+                stream["width"], stream["height"] = struct.unpack_from(">HH", data, entry + 32)
+            elif entry is not None and codec_type == "audio":
+                stream["channels"] = struct.unpack_from(">H", data, entry + 24)[0]
+                stream["sample_rate"] = str(struct.unpack_from(">I", data, entry + 32)[0] >> 16)
+            streams.append(stream)
+
+    if duration is None:
+        durations = [s["duration"] for s in streams if s.get("duration")]
+        duration = max(durations) if durations else None
+    return duration, streams
+
+
+def probe_mp4_header(url) -> MediaInfo:
+    """
+    Read only the box headers of an MP4 / MOV / 3GP and the moov box, with range requests.
+    Faststart files are answered from the first REMOTE_PROBE_HEAD_BYTES; for a moov at
+    the end, mdat is skipped by offset and just the moov box is fetched.
+    """
+    head, total = _fetch_range(url, 0, REMOTE_PROBE_HEAD_BYTES)
+    if len(head) < 8 or head[4:8] not in (b"ftyp", b"moov", b"wide", b"free", b"skip", b"mdat"):
+        raise NotMp4Error(f"No MP4 header in {url}")
+
+    buffer, buffer_start = head, 0
+    offset = 0
+    for _ in range(64):
+        if total is not None and offset >= total:
+            break
+        if offset + 16 > buffer_start + len(buffer):
+            buffer, buffer_start = _fetch_range(url, offset, min(REMOTE_PROBE_HEAD_BYTES, 64 * 1024))[0], offset
+            if len(buffer) < 8:
+                break
+
+        local = offset - buffer_start
+        size, box_type = struct.unpack_from(">I4s", buffer, local)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buffer, local + 8)[0]
+            header = 16
+        elif size == 0:
+            if total is None:
+                break
+            size = total - offset
+        if size < header:
+            raise RemoteProbeError(f"Corrupt box at offset {offset} in {url}")
+
+        if box_type == b"moov":
+            if size > REMOTE_PROBE_MAX_HEADER_BYTES:
+                raise RemoteProbeError(f"moov box of {size} bytes is too large to fetch")
+            if local + size > len(buffer):
+                buffer, buffer_start = _fetch_range(url, offset, size)[0], offset
+                local = 0
+            if local + size > len(buffer):
+                raise RemoteProbeError(f"Truncated moov box in {url}")
+            duration, streams = parse_moov(buffer, local + header, local + size)
+            return MediaInfo(path=url, format_name=MP4_FORMAT_NAME, duration=duration,
+                             size=total or 0, streams=streams)
+        offset += size
+
+    raise RemoteProbeError(f"No moov box found in {url}")
+
+
+def probe_with_ffprobe(url) -> MediaInfo:
+    """Let ffprobe read the URL itself; it seeks with ranges and stops once it has the streams"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-rw_timeout', str(int(REMOTE_PROBE_TIMEOUT * 1e6)),
+             '-show_format', '-show_streams', '-of', 'json', url],
+            capture_output=True,
+            text=True,
+            timeout=REMOTE_PROBE_TIMEOUT * 3
+        )
+    except subprocess.TimeoutExpired:
+        raise RemoteProbeError(f"ffprobe timed out on {url}")
+    except OSError as e:
+        raise RemoteProbeError(f"ffprobe unavailable: {e}")
+    if result.returncode != 0:
+        raise RemoteProbeError(result.stderr.strip()[:200] or "ffprobe failed")
+
+    try:
+        data = json.loads(result.stdout or "{}")
+    except json.JSONDecodeError as e:
+        raise RemoteProbeError(f"Invalid ffprobe output: {e}")
+    fmt = data.get("format", {})
+    try:
+        duration = float(fmt.get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    size = fmt.get("size")
+    return MediaInfo(
+        path=url,
+        format_name=fmt.get("format_name"),
+        duration=duration,
+        size=int(size) if str(size).isdigit() else 0,
+        streams=data.get("streams", [])
+    )
+
+
+def probe_remote_media(url) -> MediaInfo:
+    """
+    Duration, streams (codecs, resolution) and size of a remote video without
+    downloading it: MP4-family headers are parsed from byte ranges, anything
+    else (or a header that cannot be read that way) goes to ffprobe on the URL.
+    Results are cached per URL for REMOTE_PROBE_CACHE_TTL.
+    """
+    now = time.time()
+    with _cache_lock:
+        cached = _cache.get(url)
+        if cached and cached[0] > now:
+            _cache.move_to_end(url)
+            _stats["hits"] += 1
+            return cached[1]
+        _stats["misses"] += 1
+
+    try:
+        info = probe_mp4_header(url)
+        with _cache_lock:
+            _stats["header_probes"] += 1
+    except Exception as e:
+        print(f"⚠️ Header probe failed for {url} ({e}), falling back to ffprobe")
+        info = probe_with_ffprobe(url)
+        with _cache_lock:
+            _stats["ffprobe_fallbacks"] += 1
+
+    with _cache_lock:
+        _cache[url] = (now + REMOTE_PROBE_CACHE_TTL, info)
+        _cache.move_to_end(url)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return info
+
+
+def get_remote_probe_stats() -> dict:
+    with _cache_lock:
+        return {**_stats, "entries": len(_cache)}
+
+
+if __name__ == "__main__":
+    # python -m app.services.remote_probe <url> [<url> ...]
+    for url in sys.argv[1:]:
+        start = time.perf_counter()
+        info = probe_remote_media(url)
+        print(f"{url}\n  {info.format_name}, {info.duration}s, {info.size} bytes, "
+              f"{time.perf_counter() - start:.2f}s")
+        for stream in info.streams:
+            resolution = f" {stream['width']}x{stream['height']}" if "width" in stream else ""
+            print(f"  {stream.get('codec_type')}: {stream.get('codec_name')}{resolution}")
+    print(get_remote_probe_stats())
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from app.config import RENDER_CACHE_PATH, RENDER_CACHE_TTL
+
+
+def make_template_key(**parts) -> str:
+    """Stable hash of everything that decides how a clip is rendered (assets, ratio, profile...)"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Persistent index of finished renders: (Vizard videoId, template key) ->
+    uploaded URL and duration.
+
+    The template key covers the intro/outro/logo fingerprints, ratio, logo
+    position, render mode and encoder profile, so a changed template asset
+    simply misses. invalidate_asset() drops every render built from a URL, and
+    entries older than ttl expire (the uploaded file may not live forever).
+    SQLite in WAL mode lets several worker processes share the index.
+    """
+
+    def __init__(self, db_path, ttl=RENDER_CACHE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS renders (
+                video_id TEXT,
+                template_key TEXT,
+                intro_url TEXT,
+                outro_url TEXT,
+                logo_url TEXT,
+                video_url TEXT,
+                duration REAL,
+                created REAL,
+                last_used REAL,
+                hits INTEGER DEFAULT 0,
+                PRIMARY KEY (video_id, template_key)
+            )
+        """)
+        for column in ("intro_url", "outro_url", "logo_url"):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS renders_{column} ON renders ({column})")
+        self._conn = conn
+        return conn
+
+    def get(self, video_id, template_key):
+        """{'videoUrl', 'duration'} of a finished render, or None"""
+        if video_id is None:
+            return None
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT video_url, duration, created FROM renders WHERE video_id = ? AND template_key = ?",
+                (str(video_id), template_key)
+            ).fetchone()
+            if row is not None and self.ttl and time.time() - row[2] > self.ttl:
+                conn.execute(
+                    "DELETE FROM renders WHERE video_id = ? AND template_key = ?", (str(video_id), template_key)
+                )
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE renders SET hits = hits + 1, last_used = ? WHERE video_id = ? AND template_key = ?",
+                (time.time(), str(video_id), template_key)
+            )
+            self.hits += 1
+            return {"videoUrl": row[0], "duration": row[1]}
+
+    def put(self, video_id, template_key, video_url, duration, intro_url=None, outro_url=None, logo_url=None):
+        if video_id is None or not video_url:
+            return
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO renders "
+                "(video_id, template_key, intro_url, outro_url, logo_url, video_url, duration, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(video_id), template_key, intro_url, outro_url, logo_url, video_url, duration, now, now)
+            )
+
+    def invalidate_asset(self, url) -> int:
+        """Forget every render that used url as intro, outro or logo; returns rows removed"""
+        with self._lock:
+            cursor = self._connect().execute(
+                "DELETE FROM renders WHERE intro_url = ? OR outro_url = ? OR logo_url = ?", (url, url, url)
+            )
+            return cursor.rowcount
+
+    def invalidate_video(self, video_id) -> int:
+        with self._lock:
+            cursor = self._connect().execute("DELETE FROM renders WHERE video_id = ?", (str(video_id),))
+            return cursor.rowcount
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM renders").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+# Global render index used by Add_Template
+render_cache = RenderCache(RENDER_CACHE_PATH)
@@ -0,0 +1,125 @@
+import re
+import time
+import asyncio
+import hashlib
+import httpx
+from typing import Dict, Optional
+from app.config import BACKEND_URL, TEMPLATE_CACHE_TTL, TEMPLATE_FETCH_TIMEOUT
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class TemplateCache:
+    """
+    Async cache of backend /templates/{id} responses.
+
+    Entries are kept per (template, auth token), since the backend decides
+    per user whether a template is visible. A fresh entry is served without a
+    request; a stale one is revalidated with If-None-Match / If-Modified-Since,
+    so an unchanged template costs a 304. The TTL comes from the response's
+    Cache-Control max-age when the backend sends one, otherwise
+    TEMPLATE_CACHE_TTL. Concurrent lookups of the same entry share one
+    request, and invalidate() drops a template as soon as it is edited.
+    """
+
+    def __init__(self, base_url=BACKEND_URL, ttl=TEMPLATE_CACHE_TTL, timeout=TEMPLATE_FETCH_TIMEOUT):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.entries: Dict[tuple, dict] = {}
+        self.inflight: Dict[tuple, asyncio.Future] = {}
+        # Bumped by invalidate() so a fetch started before the edit is not stored
+        self.generations: Dict[str, int] = {}
+        self.generation = 0
+        self.stats = {"hits": 0, "fetches": 0, "revalidated": 0, "coalesced": 0, "invalidated": 0}
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._client
+
+    def _ttl(self, response: httpx.Response) -> float:
+        cache_control = response.headers.get("Cache-Control", "")
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return 0
+        match = _MAX_AGE.search(cache_control)
+        return float(match.group(1)) if match else self.ttl
+
+    async def get(self, template_id: str, auth_token: str) -> dict:
+        """Template data (the response's 'data' field); raises ValueError if it cannot be fetched"""
+        key = (str(template_id), hashlib.sha256((auth_token or "").encode("utf-8")).hexdigest())
+        entry = self.entries.get(key)
+        if entry is not None and entry["expires_at"] > time.time():
+            self.stats["hits"] += 1
+            return entry["data"]
+
+        future = self.inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._fetch(key, template_id, auth_token, entry))
+        self.inflight[key] = future
+        future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, key, template_id, auth_token, entry: Optional[dict]) -> dict:
+        generation = (self.generation, self.generations.get(str(template_id), 0))
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        self.stats["fetches"] += 1
+        try:
+            response = await self._get_client().get(f"/templates/{template_id}", headers=headers)
+            if response.status_code == 304 and entry is not None:
+                self.stats["revalidated"] += 1
+                data = entry["data"]
+            else:
+                response.raise_for_status()
+                data = response.json()['data']
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            raise ValueError(f"Failed to fetch template info: {str(e)}")
+
+        if (self.generation, self.generations.get(str(template_id), 0)) == generation:
+            self.entries[key] = {
+                "data": data,
+                "etag": response.headers.get("ETag") or (entry or {}).get("etag"),
+                "last_modified": response.headers.get("Last-Modified") or (entry or {}).get("last_modified"),
+                "expires_at": time.time() + self._ttl(response)
+            }
+        return data
+
+    def invalidate(self, template_id: Optional[str] = None) -> int:
+        """Drop one template (for every user), or everything; returns entries removed"""
+        if template_id is None:
+            keys = list(self.entries)
+            self.generation += 1
+        else:
+            template_id = str(template_id)
+            keys = [k for k in self.entries if k[0] == template_id]
+            self.generations[template_id] = self.generations.get(template_id, 0) + 1
+        for key in keys:
+            del self.entries[key]
+        self.stats["invalidated"] += len(keys)
+        return len(keys)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "entries": len(self.entries), "inflight": len(self.inflight), "ttl": self.ttl}
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global cache used by /generate
+template_cache = TemplateCache()
@@ -0,0 +1,152 @@
+import asyncio
+import random
+import httpx
+from dataclasses import dataclass, field
+from typing import Optional
+from app.config import VIZARD_API_KEY, VIZARD_BASE_URL, VIZARD_TIMEOUT, VIZARD_RETRIES, VIZARD_HTTP2
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Vizard response codes
+SUCCESS_CODE = 2000
+PROCESSING_CODE = 1000
+# Used for our own transport failures, as upload_video always did
+CLIENT_ERROR_CODE = 5000
+# Transient: rate limited (4003) and Vizard internal error (5000) come back in HTTP 200 bodies
+RATE_LIMIT_CODE = 4003
+INTERNAL_ERROR_CODE = 5000
+# The project itself failed: clipping failed, unsupported format, bad or unreachable
+# video URL, illegal parameter, insufficient account time, bad clip count, unsupported language
+PROJECT_FAILED_CODES = (4002, 4004, 4005, 4006, 4007, 4008, 4009, 4010)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Project creation is not idempotent: only retry when Vizard surely did not process it
+CREATE_RETRY_STATUSES = (429, 503)
+
+
+class VizardError(Exception):
+    """Vizard could not be reached or answered with something other than JSON"""
+    pass
+
+
+@dataclass
+class CreateProjectResponse:
+    code: int
+    project_id: Optional[int] = None
+    message: Optional[str] = None
+    raw: dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.code == SUCCESS_CODE and self.project_id is not None
+
+
+@dataclass
+class ProjectQueryResponse:
+    code: int
+    project_id: Optional[int] = None
+    videos: list = field(default_factory=list)
+    message: Optional[str] = None
+    raw: dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.code == SUCCESS_CODE
+
+    @property
+    def is_processing(self) -> bool:
+        return self.code == PROCESSING_CODE
+
+    @property
+    def failed(self) -> bool:
+        """Vizard gave up on the project (as opposed to a transient or unknown code)"""
+        return self.code in PROJECT_FAILED_CODES
+
+
+class VizardClient:
+    """
+    Async Vizard API client on one shared httpx.AsyncClient (keep-alive pool,
+    HTTP/2 when available, timeouts). 429 / 5xx and transport errors are retried
+    with full-jitter exponential backoff, honouring Retry-After (project creation
+    only when the request cannot have been processed).
+    """
+
+    def __init__(self, base_url=VIZARD_BASE_URL, api_key=VIZARD_API_KEY,
+                 timeout=VIZARD_TIMEOUT, retries=VIZARD_RETRIES, http2=VIZARD_HTTP2):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Content-Type": "application/json", "VIZARDAI_API_KEY": self.api_key or ""},
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                http2=self.http2
+            )
+        return self._client
+
+    def _backoff(self, attempt, retry_after=None) -> float:
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+    async def _request(self, method, path, json=None, idempotent=True) -> dict:
+        client = self._get_client()
+        retry_statuses = RETRY_STATUSES if idempotent else CREATE_RETRY_STATUSES
+        # Errors after the request may have reached Vizard are only retried when idempotent
+        retry_errors = (httpx.TransportError, ValueError) if idempotent else (httpx.ConnectError, httpx.ConnectTimeout)
+
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                response = await client.request(method, path, json=json)
+                if response.status_code not in retry_statuses:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            except retry_errors as e:
+                # ValueError: body was not JSON
+                error = f"{type(e).__name__}: {e}"
+            except (httpx.HTTPError, ValueError) as e:
+                raise VizardError(f"Vizard {method} {path} failed: {e}") from e
+
+            if attempt < self.retries:
+                wait = self._backoff(attempt, retry_after)
+                print(f"⚠️ Vizard {method} {path} failed ({error}), retrying in {wait:.1f}s")
+                await asyncio.sleep(wait)
+
+        raise VizardError(f"Vizard {method} {path} failed after {self.retries + 1} attempts: {error}")
+
+    async def create_project(self, data: dict) -> CreateProjectResponse:
+        body = await self._request("POST", "/project/create", json=data, idempotent=False)
+        return CreateProjectResponse(
+            code=body.get("code"), project_id=body.get("projectId"),
+            message=body.get("message") or body.get("errMsg"), raw=body
+        )
+
+    async def query_project(self, project_id) -> ProjectQueryResponse:
+        body = await self._request("GET", f"/project/query/{project_id}")
+        return ProjectQueryResponse(
+            code=body.get("code"), project_id=body.get("projectId") or project_id,
+            videos=body.get("videos") or [], message=body.get("message") or body.get("errMsg"), raw=body
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global client shared by /generate and polling
+vizard_client = VizardClient()
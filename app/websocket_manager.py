@@ -2,133 +2,157 @@ import asyncio
 import json
 import time
 from fastapi import WebSocket
-from typing import Dict, List, Optional
+from collections import deque
+from typing import Deque, Dict, List, Optional
 
 class ConnectionManager:
+    """
+    Per-project message delivery to any number of subscribers.
+
+    Every project keeps an ordered message history (each message numbered with
+    a per-project seq). Each connection has its own cursor into that history
+    and its own asyncio.Event; send_message appends and sets every subscriber's
+    event, so idle connections cost nothing and messages go out as soon as they
+    are sent. A connection that joins late (a reconnect, or a duplicate
+    /generate attached to the same project) replays the history first, and
+    clients can dedupe by seq. Project ids are normalized to str (Vizard sends
+    ints, WebSocket paths give strings).
+    """
+
+    HISTORY_LIMIT = 500
+    # Histories without subscribers are dropped after this long without activity
+    HISTORY_TTL_SECONDS = 3600
+    TERMINAL_TYPES = ("result", "error", "cancelled")
+
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.message_queues: Dict[str, List[dict]] = {}
-        self.connection_times: Dict[str, float] = {}
+        self.active_connections: Dict[str, Dict[WebSocket, dict]] = {}
+        self.message_queues: Dict[str, Deque[dict]] = {}
+        self.next_seq: Dict[str, int] = {}
+        self.last_activity: Dict[str, float] = {}
+        self.connection_times: Dict[int, float] = {}
+
+    @staticmethod
+    def _key(project_id) -> str:
+        return str(project_id)
+
+    def _queue(self, key: str) -> Deque[dict]:
+        if key not in self.message_queues:
+            self.message_queues[key] = deque(maxlen=self.HISTORY_LIMIT)
+        return self.message_queues[key]
+
+    def _drop_history(self, key: str):
+        self.message_queues.pop(key, None)
+        self.next_seq.pop(key, None)
+        self.last_activity.pop(key, None)
+
+    def _prune(self):
+        """Drop histories nobody is subscribed to and nothing was sent to for a long time"""
+        cutoff = time.time() - self.HISTORY_TTL_SECONDS
+        for key, last in list(self.last_activity.items()):
+            if last < cutoff and not self.active_connections.get(key):
+                self._drop_history(key)
     
     async def connect(self, websocket: WebSocket, project_id: str):
-        """Accept WebSocket connection"""
+        """Accept WebSocket connection and subscribe it from the start of the history"""
+        key = self._key(project_id)
         await websocket.accept()
-        self.active_connections[project_id] = websocket
-        self.connection_times[project_id] = time.time()
+        subscribers = self.active_connections.setdefault(key, {})
+        subscribers[websocket] = {"event": asyncio.Event(), "seq": 0}
+        self.connection_times[id(websocket)] = time.time()
+        self.last_activity[key] = time.time()
         
-        # Initialize message queue if not exists
-        if project_id not in self.message_queues:
-            self.message_queues[project_id] = []
+        # Wake the processor for anything already in the history
+        if self.message_queues.get(key):
+            subscribers[websocket]["event"].set()
         
-        print(f"✅ WebSocket connected for project: {project_id}")
-        print(f"📊 Active connections: {len(self.active_connections)}")
+        print(f"✅ WebSocket connected for project: {project_id} ({len(subscribers)} subscriber(s))")
+        print(f"📊 Active connections: {sum(len(s) for s in self.active_connections.values())}")
     
-    def disconnect(self, project_id: str):
-        """Remove WebSocket connection"""
-        if project_id in self.active_connections:
-            connection_duration = time.time() - self.connection_times.get(project_id, time.time())
-            del self.active_connections[project_id]
-            print(f"🔌 Disconnected: {project_id} (was connected for {connection_duration:.1f}s)")
-            print(f"📊 Active connections: {len(self.active_connections)}")
-        
-        # Clean up message queue
-        if project_id in self.message_queues:
-            del self.message_queues[project_id]
-        
-        if project_id in self.connection_times:
-            del self.connection_times[project_id]
+    def disconnect(self, project_id: str, websocket: Optional[WebSocket] = None):
+        """Remove one WebSocket subscription (or all of the project's when websocket is None)"""
+        key = self._key(project_id)
+        subscribers = self.active_connections.get(key, {})
+        for ws in ([websocket] if websocket is not None else list(subscribers)):
+            if subscribers.pop(ws, None) is not None:
+                connection_duration = time.time() - self.connection_times.pop(id(ws), time.time())
+                print(f"🔌 Disconnected: {project_id} (was connected for {connection_duration:.1f}s)")
+        if not subscribers:
+            self.active_connections.pop(key, None)
+            # Keep an unfinished project's history for reconnects
+            queue = self.message_queues.get(key)
+            if not queue or queue[-1].get("type") in self.TERMINAL_TYPES:
+                self._drop_history(key)
+        print(f"📊 Active connections: {sum(len(s) for s in self.active_connections.values())}")
     
     def is_connected(self, project_id: str) -> bool:
-        """Check if client is connected"""
-        return project_id in self.active_connections
+        """Check if any client is subscribed"""
+        return bool(self.active_connections.get(self._key(project_id)))
+
+    def last_progress(self, project_id: str) -> Optional[int]:
+        """Most recent progress percentage sent for a project, if any"""
+        for message in reversed(self.message_queues.get(self._key(project_id), ())):
+            if message.get("type") == "progress":
+                return message.get("progress")
+        return None
     
     async def send_message(self, project_id: str, message: dict):
         """
-        Send message to client or queue it if not connected
-        IMPORTANT: Check both string and int versions of project_id
+        Append a message to the project's history and wake every subscriber.
+        Returns True if a client is connected (delivery is immediate),
+        False if the message waits for a client to connect.
         """
-        # Try to find the actual key (could be string or int)
-        actual_key = None
-        
-        # Check exact match first
-        if project_id in self.active_connections:
-            actual_key = project_id
-        else:
-            # Try converting types
-            try:
-                # Try as int
-                int_id = int(project_id) if isinstance(project_id, str) else project_id
-                if int_id in self.active_connections:
-                    actual_key = int_id
-                
-                # Try as string
-                str_id = str(project_id)
-                if str_id in self.active_connections:
-                    actual_key = str_id
-            except (ValueError, TypeError):
-                pass
-        
-        if actual_key is not None:
-            try:
-                websocket = self.active_connections[actual_key]
-                await websocket.send_text(json.dumps(message))
-                msg_type = message.get('type', 'message')
-                progress = f" ({message.get('progress')}%)" if 'progress' in message else ''
-                print(f"✅ Sent {msg_type}{progress} to {project_id}")
-                return True
-            except Exception as e:
-                print(f"❌ Failed to send message to {project_id}: {e}")
-                # Queue the message for retry
-                if project_id not in self.message_queues:
-                    self.message_queues[project_id] = []
-                self.message_queues[project_id].append(message)
-                print(f"📥 Queued message for later delivery")
-                return False
-        else:
-            # Client not connected yet, queue the message
-            if project_id not in self.message_queues:
-                self.message_queues[project_id] = []
-            self.message_queues[project_id].append(message)
-            msg_type = message.get('type', 'message')
-            progress = f" ({message.get('progress')}%)" if 'progress' in message else ''
-            print(f"📥 Queued {msg_type}{progress} for {project_id} (connection not found)")
-            print(f"🔍 Active connections: {list(self.active_connections.keys())}")
-            return False
+        key = self._key(project_id)
+        self._prune()
+        seq = self.next_seq.get(key, 0) + 1
+        self.next_seq[key] = seq
+        message["seq"] = seq
+        self._queue(key).append(message)
+        self.last_activity[key] = time.time()
+
+        subscribers = self.active_connections.get(key)
+        if subscribers:
+            for state in subscribers.values():
+                state["event"].set()
+            return True
+
+        msg_type = message.get('type', 'message')
+        progress = f" ({message.get('progress')}%)" if 'progress' in message else ''
+        print(f"📥 Queued {msg_type}{progress} for {project_id} (connection not found)")
+        return False
     
     async def process_message_queue(self, project_id: str, websocket: WebSocket):
         """
-        Process queued messages for a connection
-        CRITICAL: This must continuously check for new messages
+        Deliver the project's messages to one connection: history first, then live.
+        Sleeps on the connection's event between messages - no polling.
         """
+        key = self._key(project_id)
+        state = self.active_connections.get(key, {}).get(websocket)
+        if state is None:
+            print(f"⚠️ No subscription for {project_id}, call connect() first")
+            return
         print(f"🎬 Starting message processor for {project_id}")
         processed_count = 0
         
         try:
             while True:
-                # Check if there are queued messages
-                if project_id in self.message_queues and self.message_queues[project_id]:
-                    # Get all pending messages
-                    messages_to_send = self.message_queues[project_id].copy()
-                    self.message_queues[project_id].clear()
-                    
-                    # Send each message
-                    for message in messages_to_send:
-                        try:
-                            await websocket.send_text(json.dumps(message))
-                            processed_count += 1
-                            msg_type = message.get('type', 'unknown')
-                            progress = message.get('progress', '')
-                            print(f"✅ Sent queued {msg_type} {f'({progress}%)' if progress else ''} to {project_id}")
-                        except Exception as e:
-                            print(f"❌ Failed to send queued message: {e}")
-                            # Re-queue failed message
-                            if project_id in self.message_queues:
-                                self.message_queues[project_id].append(message)
-                            break
-                
-                # Small delay to avoid busy waiting
-                # IMPORTANT: Must be small enough to catch new messages quickly
-                await asyncio.sleep(0.1)  # Check every 100ms
+                # Clear before scanning: anything sent while we are sending sets it again
+                state["event"].clear()
+                pending = [m for m in self.message_queues.get(key, ()) if m["seq"] > state["seq"]]
+
+                for message in pending:
+                    try:
+                        await websocket.send_text(json.dumps(message))
+                    except Exception as e:
+                        # Still in the history for the next connection
+                        print(f"❌ Failed to send message: {e}")
+                        return
+                    state["seq"] = message["seq"]
+                    processed_count += 1
+                    msg_type = message.get('type', 'unknown')
+                    progress = message.get('progress', '')
+                    print(f"✅ Sent {msg_type} {f'({progress}%)' if progress else ''} to {project_id}")
+
+                await state["event"].wait()
                 
         except asyncio.CancelledError:
             print(f"🛑 Message processor stopped for {project_id} (processed {processed_count} messages)")
@@ -183,27 +207,28 @@ class ConnectionManager:
     
     def get_connection_info(self, project_id: str) -> dict:
         """Get connection information for debugging"""
-        is_connected = project_id in self.active_connections
-        queue_size = len(self.message_queues.get(project_id, []))
-        connected_duration = None
-        
-        if is_connected and project_id in self.connection_times:
-            connected_duration = time.time() - self.connection_times[project_id]
+        key = self._key(project_id)
+        subscribers = self.active_connections.get(key, {})
+        history = self.message_queues.get(key, deque())
+        now = time.time()
         
         return {
-            "connected": is_connected,
-            "queue_size": queue_size,
-            "connected_duration_seconds": connected_duration,
-            "queued_messages": self.message_queues.get(project_id, [])[:5] if queue_size > 0 else []
+            "connected": bool(subscribers),
+            "subscribers": len(subscribers),
+            "queue_size": len(history),
+            "connected_duration_seconds": [
+                now - self.connection_times.get(id(ws), now) for ws in subscribers
+            ],
+            "queued_messages": list(history)[-5:]
         }
     
     def get_stats(self) -> dict:
         """Get overall manager statistics"""
         return {
-            "active_connections": len(self.active_connections),
+            "active_connections": sum(len(s) for s in self.active_connections.values()),
             "projects_with_queues": len(self.message_queues),
             "total_queued_messages": sum(len(q) for q in self.message_queues.values()),
-            "connections": list(self.active_connections.keys())
+            "connections": {key: len(s) for key, s in self.active_connections.items()}
         }
 
 # Global instance
@@ -0,0 +1,102 @@
+"""
+Microbenchmark: CPU cost of idle WebSocket connections in ConnectionManager.
+
+Compares the old delivery loop (wake every 100 ms per connection and re-scan the
+queue) with the event-driven process_message_queue, and measures the delay
+between send_message() and the message reaching the socket.
+
+Usage:
+    python bench_websocket_idle.py [connections] [seconds]
+"""
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+from app.websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Stands in for a Starlette WebSocket; records when the last message arrived"""
+
+    def __init__(self):
+        self.delivered = asyncio.Event()
+        self.delivered_at = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.delivered_at = time.perf_counter()
+        self.delivered.set()
+
+
+async def polling_processor(manager, project_id, websocket):
+    """The previous implementation: poll the queue every 100 ms"""
+    key = str(project_id)
+    while True:
+        queue = manager.message_queues.get(key)
+        if queue:
+            messages_to_send = list(queue)
+            queue.clear()
+            for message in messages_to_send:
+                await websocket.send_text(json.dumps(message))
+        await asyncio.sleep(0.1)
+
+
+async def event_processor(manager, project_id, websocket):
+    await manager.process_message_queue(project_id, websocket)
+
+
+async def measure(processor, connections, seconds):
+    manager = ConnectionManager()
+    sockets = {}
+    tasks = []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in range(connections):
+            project_id = str(n)
+            websocket = FakeWebSocket()
+            sockets[project_id] = websocket
+            await manager.connect(websocket, project_id)
+            tasks.append(asyncio.create_task(processor(manager, project_id, websocket)))
+
+        # Let every processor reach its idle state
+        await asyncio.sleep(0.5)
+
+        cpu_start = time.process_time()
+        await asyncio.sleep(seconds)
+        cpu_seconds = time.process_time() - cpu_start
+
+        # Delivery latency for a single message to one idle connection
+        latencies = []
+        for project_id in list(sockets)[:20]:
+            websocket = sockets[project_id]
+            websocket.delivered.clear()
+            sent_at = time.perf_counter()
+            await manager.send_message(project_id, {"type": "progress", "progress": 50})
+            await websocket.delivered.wait()
+            latencies.append((websocket.delivered_at - sent_at) * 1000)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    cpu_per_1k = cpu_seconds / seconds * 1000 / connections
+    return cpu_per_1k, sum(latencies) / len(latencies)
+
+
+async def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"Idle connections: {connections}, measuring for {seconds:.0f}s each\n")
+    print(f"{'delivery':<16}{'CPU s/s per 1k idle':>22}{'avg latency (ms)':>20}")
+    for name, processor in (("polling 100ms", polling_processor), ("event-driven", event_processor)):
+        cpu_per_1k, latency_ms = await measure(processor, connections, seconds)
+        print(f"{name:<16}{cpu_per_1k:>22.4f}{latency_ms:>20.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())